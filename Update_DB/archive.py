@@ -0,0 +1,145 @@
+import os
+import time
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from exception_config import exception
+from json_cache import CACHE_LOCK, read_json, write_json
+from logging_config import logger
+from params import ARCHIVE_COMPRESSION
+from parquet_export import arrow_safe
+
+MANIFEST_FILE = 'manifest.json'
+
+
+# Function to build the path of an archived frame
+def archive_path(FOLDER_PATH_OUT: Path, file: str) -> str:
+    """Returns the Parquet file that holds the parsed frame of a workbook, e.g. RTL_arch/RTL_2024_07.parquet."""
+    return os.path.join(FOLDER_PATH_OUT, f"{os.path.splitext(file)[0]}.parquet")
+
+# Function to read the archive manifest of a folder
+def read_manifest(FOLDER_PATH_OUT: Path) -> dict:
+    """Returns the archived files of a folder: file -> Parquet/xlsx copies, rows, days and companies."""
+    return read_json(os.path.join(FOLDER_PATH_OUT, MANIFEST_FILE), {})
+
+# Function to archive the parsed frame of a file
+@exception
+def archive_frame(
+    data: pd.DataFrame,
+    FOLDER_PATH_OUT: Path,
+    file: str,
+    PARQUET: bool = True,
+    XLSX: bool = True,
+    ARCHIVED_AT: float | None = None
+) -> bool:
+    """Writes the parsed frame of a workbook as compressed Parquet and indexes it in the folder manifest.
+
+    Args:
+        data (pd.DataFrame): The sheet as read, with the 'Day' column already parsed to dates.
+        FOLDER_PATH_OUT (Path): The archive folder of the table.
+        file (str): Name of the workbook.
+        PARQUET (bool, optional): Whether to write the Parquet copy. Defaults to True.
+        XLSX (bool, optional): Whether the workbook itself is kept in the folder. Defaults to True.
+        ARCHIVED_AT (float | None, optional): Archive time as a timestamp, e.g. the mtime of an older workbook. Defaults to now.
+
+    Returns:
+        bool: True when the frame is archived and indexed.
+    """
+    os.makedirs(FOLDER_PATH_OUT, exist_ok=True)
+    parquet_file = None
+    if PARQUET:
+        file_path = archive_path(FOLDER_PATH_OUT, file)
+        tmp_path = f"{file_path}.tmp"
+        arrow_safe(data).to_parquet(tmp_path, engine='pyarrow', index=False, compression=ARCHIVE_COMPRESSION)
+        os.replace(tmp_path, file_path)
+        parquet_file = os.path.basename(file_path)
+
+    days = pd.Series(data['Day']).dropna().unique() if 'Day' in data.columns else []
+    companies = data['Company'].dropna().astype(str).unique() if 'Company' in data.columns else []
+    with CACHE_LOCK:
+        manifest = read_manifest(FOLDER_PATH_OUT)
+        manifest[file] = {
+            "parquet": parquet_file,
+            "xlsx": file if XLSX else None,
+            "rows": len(data),
+            "days": sorted(str(day) for day in days),
+            "companies": sorted(companies),
+            "archived_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ARCHIVED_AT)),
+        }
+        write_json(os.path.join(FOLDER_PATH_OUT, MANIFEST_FILE), manifest)
+    return True
+
+# Function to pick the archived files of a date range
+def archived_files(FOLDER_PATH_OUT: Path, start: date, end: date) -> dict[str, dict]:
+    """Returns the manifest entries with at least one day between start and end (inclusive).
+
+    Args:
+        FOLDER_PATH_OUT (Path): The archive folder of the table.
+        start (date): First day.
+        end (date): Last day.
+
+    Returns:
+        dict[str, dict]: File -> manifest entry.
+    """
+    start, end = str(start), str(end)
+    return {
+        file: entry for file, entry in read_manifest(FOLDER_PATH_OUT).items()
+        if any(start <= day <= end for day in entry["days"])
+    }
+
+# Function to assign the archived days of a range to files
+def day_owners(FOLDER_PATH_OUT: Path, start: date, end: date) -> dict[str, str]:
+    """Maps every archived day between start and end to the latest Parquet copy that contains it.
+
+    Like the day-wide deletes of the regular load, a later file replaces the days it shares with earlier ones.
+
+    Args:
+        FOLDER_PATH_OUT (Path): The archive folder of the table.
+        start (date): First day.
+        end (date): Last day.
+
+    Returns:
+        dict[str, str]: ISO day -> Parquet file name.
+    """
+    entries = archived_files(FOLDER_PATH_OUT, start, end)
+    missing = [file for file, entry in entries.items() if not entry["parquet"]]
+    if missing:
+        logger.warning(f"no Parquet copy in {FOLDER_PATH_OUT} for {len(missing)} files: {missing[:5]}")
+
+    owners = {}
+    for entry in sorted((entry for entry in entries.values() if entry["parquet"]), key=lambda entry: entry["archived_at"]):
+        for day in entry["days"]:
+            if str(start) <= day <= str(end):
+                owners[day] = entry["parquet"]
+    return dict(sorted(owners.items()))
+
+# Function to read a date range from the archive
+def read_archive(FOLDER_PATH_OUT: Path, start: date, end: date) -> pd.DataFrame | None:
+    """Reads the archived rows of a date range from the Parquet copies, without parsing any workbook.
+
+    Each day is read from the latest archived file that contains it (see day_owners),
+    so overlapping exports don't double the rows.
+
+    Args:
+        FOLDER_PATH_OUT (Path): The archive folder of the table.
+        start (date): First day.
+        end (date): Last day.
+
+    Returns:
+        pd.DataFrame | None: The rows with the sheet columns, or None if nothing is archived for the range.
+    """
+    owners = day_owners(FOLDER_PATH_OUT, start, end)
+    if not owners:
+        return None
+
+    frames = []
+    for parquet_file in dict.fromkeys(owners.values()):
+        days = [date.fromisoformat(day) for day, owner in owners.items() if owner == parquet_file]
+        table = pq.read_table(os.path.join(FOLDER_PATH_OUT, parquet_file), filters=[('Day', 'in', days)])
+        frames.append(table.to_pandas())
+    df = pd.concat(frames, ignore_index=True)
+    logger.info(f"read {len(df)} archived rows of {len(owners)} days from {len(frames)} files | {start} .. {end}")
+    return df
@@ -0,0 +1,221 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+import sqlalchemy
+
+from archive import archive_frame, day_owners, read_archive, read_manifest
+from db_read import query_cache
+from db_update import (
+    create_db_engine,
+    create_ssh_tunnel,
+    load_excel_sheets,
+    parse_days,
+    prepare_upsert_table,
+    read_excel_file,
+    replace_days_scoped,
+    sessionmaker
+)
+from exception_config import exception
+from logging_config import logger, log_function_execution
+from lookups import build_lookups
+from parquet_export import export_to_parquet
+from pipeline import finish_run, prepare_frame
+from planner import record_throughput, update_day_index
+from reconcile import reconcile_load
+from params import (
+    BACKFILL_TABLES,
+    BACKFILL_WORKERS,
+    DATA,
+    DICT_PATH,
+    EXCEL_EXTENSIONS,
+    EXPORT_TABLES,
+    LIST_OF_SHEETS
+)
+
+
+class BackfillError(Exception):
+    """Raised when a month of a backfill failed to load or to reconcile."""
+
+
+
+# Function to split a date range by month
+def month_ranges(start: date, end: date) -> list[tuple[date, date]]:
+    """Splits the days from start to end (inclusive) into calendar months, clipped to the range.
+
+    Args:
+        start (date): First day.
+        end (date): Last day.
+
+    Returns:
+        list[tuple[date, date]]: First and last day of each month of the range.
+    """
+    return [
+        (max(start, month.start_time.date()), min(end, month.end_time.date()))
+        for month in pd.period_range(start, end, freq='M')
+    ]
+
+# Function to archive the workbooks of the archive folder that have no Parquet copy
+@exception
+@log_function_execution
+def index_legacy_files(table_info: dict) -> int:
+    """Parses the workbooks of FOLDER_PATH_OUT that have no Parquet copy yet (moved there before the archive
+    existed, or archived with ARCHIVE_MODE 'xlsx') and archives them as Parquet.
+
+    The workbooks stay in place and are archived with their modification time, so newer files
+    still win the days they share with them. Each workbook is parsed only once.
+
+    Args:
+        table_info (dict): The table settings from params.DATA.
+
+    Returns:
+        int: Number of workbooks indexed.
+    """
+    folder = table_info["FOLDER_PATH_OUT"]
+    if not os.path.exists(folder):
+        return 0
+
+    manifest = read_manifest(folder)
+    files = [
+        file for file in os.listdir(folder)
+        if file.lower().endswith(EXCEL_EXTENSIONS) and not manifest.get(file, {}).get("parquet")
+    ]
+    for file in sorted(files, key=lambda file: os.path.getmtime(os.path.join(folder, file))):
+        file_path = os.path.join(folder, file)
+        logger.info(f"indexing archived file: {file}")
+        data = read_excel_file(
+                            file_path,
+                            table_info["SHEET"],
+                            table_info["SKIP"],
+                            table_info["COL_NAMES"],
+                            table_info.get("USECOLS"),
+                            table_info.get("DTYPE")
+                            )
+        archive_frame(data.assign(Day=parse_days(data['Day'])), folder, file, ARCHIVED_AT=os.path.getmtime(file_path))
+    return len(files)
+
+# Function to reload one month of a table
+@exception
+def backfill_month(
+    engine: sqlalchemy.engine.Engine,
+    table_name: str,
+    table_info: dict,
+    lookups: dict[str, pd.DataFrame] | None,
+    start: date,
+    end: date
+) -> int | None:
+    """Reloads the archived days of one month: the days are deleted and the rows inserted in one transaction.
+
+    Every archived day of the month is deleted, including days whose rows are all quarantined now,
+    so a corrected export fully replaces what was loaded before.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        table_name (str): Name of the database table.
+        table_info (dict): The table settings from params.DATA.
+        lookups (dict[str, pd.DataFrame] | None): Lookup tables from build_lookups.
+        start (date): First day of the month (or of the range).
+        end (date): Last day of the month (or of the range).
+
+    Returns:
+        int | None: Rows loaded, or None if the month failed.
+    """
+    folder = table_info["FOLDER_PATH_OUT"]
+    days = [date.fromisoformat(day) for day in day_owners(folder, start, end)]
+    if not days:
+        return 0
+
+    start_time = time.time()
+    df = prepare_frame(engine, read_archive(folder, start, end), table_name, table_info, lookups)
+    if df is None:
+        return None
+    rows = replace_days_scoped(df, engine, table_name, table_info.get("CHUNKSIZE", 10000), DAYS=days)
+    if rows is None:
+        return None
+
+    record_throughput(f"{table_name}:backfill", time.time() - start_time, rows)
+    update_day_index(table_name, days)
+    query_cache.invalidate(table_name, days)
+    # A mismatch raises and marks the month as failed; the days are replaced whole, so no hash filter is needed
+    if table_info.get("RECONCILE") is not None:
+        reconcile_load(engine, table_name, df, table_info["RECONCILE"])
+    if table_name in EXPORT_TABLES:
+        export_to_parquet(df, table_name)
+    return rows
+
+# Function to rebuild a date range from the archive
+@log_function_execution
+def backfill(start: date, end: date, tables: list[str] | None = None, WORKERS: int = BACKFILL_WORKERS) -> set[str]:
+    """Reloads the days between start and end (inclusive) from the archive of each table, month by month in parallel.
+
+    The archived files covering the range are picked from the manifest (workbooks archived before
+    the manifest existed are indexed first). Each month is read from Parquet, processed, validated
+    and enriched like a regular run, then loaded by its own worker in a delete and insert transaction
+    scoped to its days. The views built from the reloaded tables are refreshed once at the end,
+    only if every month loaded and reconciled. 'replace' tables hold only the current snapshot, so they can't be backfilled.
+
+    Args:
+        start (date): First day.
+        end (date): Last day.
+        tables (list[str] | None, optional): Tables to rebuild. Defaults to BACKFILL_TABLES.
+        WORKERS (int, optional): Months loaded at the same time. Defaults to BACKFILL_WORKERS.
+
+    Returns:
+        set[str]: Tables that got rows.
+
+    Raises:
+        ValueError: If start is after end, or a table is not in BACKFILL_TABLES.
+        BackfillError: If any month failed; the views are not refreshed then.
+    """
+    if start > end:
+        raise ValueError(f"backfill range is empty: {start} is after {end}")
+    tables = tables or BACKFILL_TABLES
+    snapshots = [table_name for table_name in tables if table_name not in BACKFILL_TABLES]
+    if snapshots:
+        raise ValueError(f"can't backfill {', '.join(snapshots)}: only {', '.join(BACKFILL_TABLES)} can be backfilled")
+
+    months = month_ranges(start, end)
+    changed_tables, failed = set(), []
+    with create_ssh_tunnel() as ssh_tunnel:
+        engine = create_db_engine(ssh_tunnel)
+        Session = sessionmaker(bind=engine)
+        lookups = build_lookups(load_excel_sheets(DICT_PATH, LIST_OF_SHEETS) or {})
+
+        for table_name in tables:
+            table_info = DATA[table_name]
+            # Days of workbooks that could not be indexed would be skipped silently
+            if index_legacy_files(table_info) is None:
+                failed.append(table_name)
+                continue
+            # The row hash column and its index are created once, before the months run in parallel
+            if table_info.get("LOAD_MODE") == 'upsert' and not prepare_upsert_table(engine, table_name):
+                failed.append(table_name)
+                continue
+
+            with ThreadPoolExecutor(max_workers=min(WORKERS, len(months))) as executor:
+                futures = {
+                    executor.submit(backfill_month, engine, table_name, table_info, lookups, month_start, month_end): month_start
+                    for month_start, month_end in months
+                }
+                for future in as_completed(futures):
+                    month = f"{table_name} {futures[future]:%Y-%m}"
+                    rows = future.result()
+                    if rows is None:
+                        logger.error(f"backfill {month} failed")
+                        failed.append(month)
+                    elif rows:
+                        logger.info(f"backfill {month}: {rows} rows loaded")
+                        changed_tables.add(table_name)
+
+        # Views are not refreshed over half-loaded tables; the failed months have to be rerun first
+        if failed:
+            logger.error(f"backfill {start} .. {end} incomplete, views not refreshed, failed: {', '.join(failed)}")
+            raise BackfillError(f"backfill {start} .. {end} failed for {', '.join(failed)}")
+
+        # Dicts are not reloaded by a backfill, only the views of the rebuilt tables are refreshed
+        with Session() as session:
+            finish_run(engine, session, None, changed_tables)
+            session.commit()
+    return changed_tables
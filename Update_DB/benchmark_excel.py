@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+from db_update import process_memory_mb, resolve_excel_engine, select_columns
+from params import DATA, EXCEL_ENGINE, EXCEL_EXTENSIONS
+
+# Interval (seconds) of the resident memory samples taken during a read
+RSS_SAMPLE_INTERVAL = 0.01
+
+
+# Function to sample the peak resident memory while a read runs
+def sample_peak_rss(stop: threading.Event, peak: list[float]) -> None:
+    """Keeps the highest resident memory of the process in peak[0] until stop is set.
+
+    Args:
+        stop (threading.Event): Set when the read is done.
+        peak (list[float]): One-item list updated in place with the peak MB.
+    """
+    while not stop.is_set():
+        peak[0] = max(peak[0], process_memory_mb())
+        stop.wait(RSS_SAMPLE_INTERVAL)
+
+
+# Function to measure one way of reading a workbook
+def measure_read(file_path: str, SHEET: str, SKIP: int, engine: str, usecols: list[int] | None, names: list[str] | None, dtype: dict[str, str] | None) -> tuple[float, float, float]:
+    """Reads one sheet and measures parse time, peak memory and the size of the resulting frame.
+
+    The peak is the growth of the process resident memory, so native allocations of the Rust
+    calamine parser are counted like openpyxl's. Without psutil only the Python heap is traced
+    (tracemalloc), which misses calamine's allocations and favours it. Run it through
+    measure_in_subprocess: in a process that already read a workbook, the allocator reuses the
+    memory that read freed and the growth is understated.
+
+    Args:
+        file_path (str): Path to the Excel file.
+        SHEET (str): Name of the sheet to read.
+        SKIP (int): Number of rows to skip at the beginning of the sheet.
+        engine (str): pandas Excel engine.
+        usecols (list[int] | None): Column positions to parse.
+        names (list[str] | None): Column names to assign.
+        dtype (dict[str, str] | None): Column dtypes.
+
+    Returns:
+        tuple[float, float, float]: Seconds, peak MB above the memory before the read, frame MB.
+    """
+    baseline = process_memory_mb()
+    if baseline is None:
+        tracemalloc.start()
+    else:
+        stop, peak = threading.Event(), [baseline]
+        sampler = threading.Thread(target=sample_peak_rss, args=(stop, peak), daemon=True)
+        sampler.start()
+
+    start_time = time.perf_counter()
+    data = pd.read_excel(file_path, sheet_name=SHEET, skiprows=SKIP, usecols=usecols, names=names, dtype=dtype, engine=engine)
+    elapsed = time.perf_counter() - start_time
+
+    if baseline is None:
+        _, traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = traced / 2**20
+    else:
+        stop.set()
+        sampler.join()
+        peak_mb = max(peak[0], process_memory_mb()) - baseline
+    return elapsed, peak_mb, data.memory_usage(deep=True).sum() / 2**20
+
+# Function to measure a read in a fresh process
+def measure_in_subprocess(*args) -> tuple[float, float, float]:
+    """Runs measure_read in its own spawned process, so no earlier read skews its memory peak.
+
+    Args:
+        *args: Arguments of measure_read.
+
+    Returns:
+        tuple[float, float, float]: Seconds, peak MB above the memory before the read, frame MB.
+    """
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(measure_read, args)
+
+# Function to compare the full openpyxl read with the pruned, typed read
+def benchmark_table(table_name: str, table_info: dict) -> None:
+    """Benchmarks every archived file of a table: full openpyxl read vs. declared usecols/dtype with EXCEL_ENGINE.
+
+    Archived workbooks are used so that nothing is moved out of the intake folders; the Parquet copies
+    and the manifest of the archive are skipped. Every read runs in a fresh process.
+
+    Args:
+        table_name (str): Name of the table in params.DATA.
+        table_info (dict): The table settings from params.DATA.
+    """
+    folder = table_info["FOLDER_PATH_OUT"]
+    if not os.path.exists(folder):
+        print(f"{table_name}: folder '{folder}' does not exist")
+        return
+
+    engine = resolve_excel_engine(EXCEL_ENGINE)
+    usecols, names, dtype = select_columns(table_info["COL_NAMES"], table_info.get("USECOLS"), table_info.get("DTYPE"))
+
+    memory = 'rss' if process_memory_mb() is not None else 'py-heap'
+    for file in os.listdir(folder):
+        if not file.lower().endswith(EXCEL_EXTENSIONS):
+            continue
+        file_path = os.path.join(folder, file)
+        baseline = measure_in_subprocess(file_path, table_info["SHEET"], table_info["SKIP"], 'openpyxl', None, table_info["COL_NAMES"], None)
+        candidate = measure_in_subprocess(file_path, table_info["SHEET"], table_info["SKIP"], engine, usecols, names, dtype)
+        print(
+            f"{table_name: <9} | {file[:40]: <40} | "
+            f"openpyxl/all {baseline[0]:7.2f}s {baseline[1]:8.1f}MB peak {memory} {baseline[2]:7.1f}MB df | "
+            f"{engine}/pruned {candidate[0]:7.2f}s {candidate[1]:8.1f}MB peak {memory} {candidate[2]:7.1f}MB df | "
+            f"x{baseline[0] / max(candidate[0], 1e-9):.1f}"
+        )
+
+
+if __name__ == '__main__':
+    tables = sys.argv[1:] or list(DATA)
+    for table_name in tables:
+        benchmark_table(table_name, DATA[table_name])
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+from db_update import create_db_engine, create_ssh_tunnel
+from exception_config import exception
+from json_cache import CACHE_LOCK, read_json, write_json
+from logging_config import logger, log_function_execution
+from parquet_export import arrow_safe
+from params import READ_CACHE_PATH, READ_CACHE_SIZE
+
+MANIFEST_FILE = 'manifest.json'
+
+
+class QueryCache:
+    """
+    Results of read queries: an in-memory LRU in front of Parquet files in READ_CACHE_PATH.
+
+    The manifest records the table and day range behind every cached result. Loads invalidate
+    the entries overlapping the days they touched, so a result is served from the cache only
+    while the rows it was built from are unchanged. The manifest is checked on every read,
+    which keeps the in-memory results of a long-lived process in step with loads of another one.
+    """
+
+    def __init__(self, CACHE_PATH: Path = READ_CACHE_PATH, SIZE: int = READ_CACHE_SIZE):
+        self.path = CACHE_PATH
+        self.size = SIZE
+        self.memory: OrderedDict[str, pd.DataFrame] = OrderedDict()
+
+    @staticmethod
+    def key(query: str, params: dict) -> str:
+        """Returns the cache key of a query and its parameters."""
+        payload = json.dumps({"query": ' '.join(query.split()), "params": params}, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def manifest(self) -> dict:
+        """Returns the cached entries: key -> table, day range and creation time."""
+        return read_json(os.path.join(self.path, MANIFEST_FILE), {})
+
+    def file_path(self, key: str) -> str:
+        """Returns the Parquet file of a cached result."""
+        return os.path.join(self.path, f"{key}.parquet")
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """Returns a copy of a cached result, or None if it is not cached or was invalidated."""
+        if key not in self.manifest():
+            self.memory.pop(key, None)
+            return None
+        if key not in self.memory:
+            try:
+                self.memory[key] = pd.read_parquet(self.file_path(key))
+            except OSError as e:
+                logger.warning(f"can't read cached query {key}: {e}")
+                return None
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+        return self.memory[key].copy()
+
+    def put(self, key: str, df: pd.DataFrame, table_name: str, start: date | None = None, end: date | None = None) -> None:
+        """
+        Stores a result. start/end bound the days it was read from; None means the result
+        may depend on any day of the table (e.g. the latest snapshot).
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            arrow_safe(df).to_parquet(self.file_path(key), engine='pyarrow', index=False)
+            with CACHE_LOCK:
+                manifest = self.manifest()
+                manifest[key] = {
+                    "table": table_name,
+                    "start": str(start) if start else None,
+                    "end": str(end) if end else None,
+                    "at": pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+                }
+                write_json(os.path.join(self.path, MANIFEST_FILE), manifest)
+        except OSError as e:
+            logger.warning(f"can't cache query {key}: {e}")
+            return
+        self.memory[key] = df.copy()
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def invalidate(self, table_name: str, days=None) -> int:
+        """
+        Drops the cached results of a table that overlap the given days (all of them when days is None).
+
+        Args:
+            table_name (str): Name of the loaded table.
+            days: Iterable of the loaded days (dates or ISO strings), or None for a full replace.
+
+        Returns:
+            int: Number of dropped results.
+        """
+        touched = None if days is None else sorted({str(day) for day in days})
+        with CACHE_LOCK:
+            manifest = self.manifest()
+            dropped = [
+                key for key, entry in manifest.items()
+                if entry["table"] == table_name and (
+                    touched is None or entry["start"] is None
+                    or any(entry["start"] <= day <= (entry["end"] or day) for day in touched)
+                )
+            ]
+            for key in dropped:
+                del manifest[key]
+                self.memory.pop(key, None)
+                if os.path.exists(self.file_path(key)):
+                    os.remove(self.file_path(key))
+            if dropped:
+                write_json(os.path.join(self.path, MANIFEST_FILE), manifest)
+                logger.info(f"invalidated {len(dropped)} cached queries of {table_name}")
+        return len(dropped)
+
+# Query cache shared by the readers and the loads of the process
+query_cache = QueryCache()
+
+# Function to run a read query through the cache
+def cached_query(
+    engine: sqlalchemy.engine.Engine | None,
+    table_name: str,
+    query: str,
+    params: dict,
+    start: date | None = None,
+    end: date | None = None
+) -> pd.DataFrame:
+    """Returns the result of a query from the cache, querying the database only on a miss.
+
+    Without an engine a tunnel is opened for the miss only, so cached reads never touch the network.
+
+    Args:
+        engine (sqlalchemy.engine.Engine | None): The database engine object, or None to connect on demand.
+        table_name (str): Table the query reads; its loads invalidate the result.
+        query (str): The SQL query with :named parameters.
+        params (dict): The query parameters.
+        start (date | None, optional): First day the result depends on. Defaults to None (any day).
+        end (date | None, optional): Last day the result depends on. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The query result.
+    """
+    key = query_cache.key(query, params)
+    df = query_cache.get(key)
+    if df is not None:
+        logger.info(f"cached query {key[:12]} | {table_name} | {len(df)} rows")
+        return df
+
+    if engine is None:
+        with create_ssh_tunnel() as ssh_tunnel:
+            df = pd.read_sql(text(query), create_db_engine(ssh_tunnel), params=params)
+    else:
+        df = pd.read_sql(text(query), engine, params=params)
+    query_cache.put(key, df, table_name, start, end)
+    return df
+
+# Function to read daily sales
+@exception
+@log_function_execution
+def sales_by_day(
+    start: date,
+    end: date,
+    stores: list[str] | None = None,
+    engine: sqlalchemy.engine.Engine | None = None
+) -> pd.DataFrame:
+    """Returns daily turnover per store (amount, pieces, receipts) between start and end (inclusive).
+
+    Example:
+        sales_by_day(date(2024, 7, 1), date(2024, 7, 31), stores=['101', '102'])
+
+    Args:
+        start (date): First day.
+        end (date): Last day.
+        stores (list[str] | None, optional): Stores to read. Defaults to all stores.
+        engine (sqlalchemy.engine.Engine | None, optional): The database engine object. Defaults to None (connect on a cache miss).
+
+    Returns:
+        pd.DataFrame: Columns day, company, store, amount, pcs, rcp.
+    """
+    query = """
+        select day, company, store, sum(amount) as amount, sum(pcs) as pcs, sum(rcp) as rcp
+        from sales
+        where day between :start and :end
+    """
+    params = {"start": start, "end": end}
+    if stores:
+        query += " and store = ANY(:stores)"
+        params["stores"] = sorted(str(store) for store in stores)
+    query += " group by day, company, store order by day, store"
+    return cached_query(engine, 'sales', query, params, start, end)
+
+# Function to read the stock of a store
+@exception
+@log_function_execution
+def stock_snapshot(
+    store: str,
+    day: date | None = None,
+    engine: sqlalchemy.engine.Engine | None = None
+) -> pd.DataFrame:
+    """Returns the stock of a store by style on a day, the latest loaded day by default.
+
+    Args:
+        store (str): The store.
+        day (date | None, optional): The stock day. Defaults to None (latest day in ms_stock).
+        engine (sqlalchemy.engine.Engine | None, optional): The database engine object. Defaults to None (connect on a cache miss).
+
+    Returns:
+        pd.DataFrame: Columns day, company, store, mfg_season, style, ttl_eoh_ttl_qty, cost_€.
+    """
+    query = """
+        select day, company, store, mfg_season, style,
+               sum(ttl_eoh_ttl_qty) as ttl_eoh_ttl_qty, sum("cost_€") as "cost_€"
+        from ms_stock
+        where store = :store and day = coalesce(cast(:day as date), (select max(day) from ms_stock))
+        group by day, company, store, mfg_season, style
+        order by mfg_season, style
+    """
+    return cached_query(engine, 'ms_stock', query, {"store": str(store), "day": day}, day, day)
@@ -1,17 +1,36 @@
+import importlib.util
 import os
+import re
 import shutil
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import pandas as pd
 import sqlalchemy
+try:
+    import psutil
+except ImportError:
+    psutil = None
 from sqlalchemy import create_engine, text, MetaData
 from sqlalchemy.orm import sessionmaker
 from sshtunnel import SSHTunnelForwarder
 
+from archive import archive_frame
 from exception_config import exception
 from db_config import DB_PARAMS, SSH_TUNNEL_PARAMS
 from logging_config import logger, log_function_execution
+from params import (
+    ARCHIVE_MODE,
+    DAY_FORMAT,
+    EXCEL_ENGINE,
+    EXCEL_ENGINE_MODULES,
+    MAX_MEMORY_MB,
+    ROW_HASH_COL,
+    SHARD_WORKERS,
+    SUBTOTAL_PATTERN
+)
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -71,21 +90,113 @@ def distribute_raw_data_to_folders(RAW_DATA_PATH: Path, fnc_target_dir, rtl_targ
             logger.info(f"moved file {filename}")
 
 
+# Function to pick the Excel parser
+def resolve_excel_engine(ENGINE: str | None = EXCEL_ENGINE) -> str:
+    """Returns the requested Excel engine if its parser is installed, otherwise 'openpyxl'.
+
+    Args:
+        ENGINE (str | None, optional): Preferred pandas Excel engine. Defaults to EXCEL_ENGINE.
+
+    Returns:
+        str: The engine name to pass to pandas.
+    """
+
+    module = EXCEL_ENGINE_MODULES.get(ENGINE)
+    if module is None or importlib.util.find_spec(module) is None:
+        if ENGINE not in (None, 'openpyxl'):
+            logger.warning(f"excel engine '{ENGINE}' is not available, falling back to openpyxl")
+        return 'openpyxl'
+    return ENGINE
+
+# Function to build usecols/names/dtype arguments for pandas
+def select_columns(COL_NAMES: list[str] | None, USECOLS: list[str] | None, DTYPE: dict[str, str] | None = None) -> tuple[list[int] | None, list[str] | None, dict[str, str] | None]:
+    """Maps the declared column names to sheet positions so only the needed columns are parsed.
+
+    Args:
+        COL_NAMES (list[str] | None): Names of all columns of the sheet, in sheet order.
+        USECOLS (list[str] | None): Names of the columns to keep. None keeps every column.
+        DTYPE (dict[str, str] | None, optional): Column dtypes, entries for skipped columns are dropped.
+
+    Returns:
+        tuple: Column positions, the names to give them and the dtypes for the kept columns.
+    """
+
+    if not USECOLS or not COL_NAMES:
+        return None, COL_NAMES, DTYPE or None
+
+    positions = sorted(COL_NAMES.index(col) for col in USECOLS)
+    names = [COL_NAMES[i] for i in positions]
+    dtype = {col: kind for col, kind in (DTYPE or {}).items() if col in names}
+    return positions, names, dtype or None
+
+# Function to read the sheet of one Excel file
+def read_excel_file(
+    file_path: Path,
+    SHEET: str,
+    SKIP: int = 0,
+    COL_NAMES: list[str] | None = None,
+    USECOLS: list[str] | None = None,
+    DTYPE: dict[str, str] | None = None,
+    ENGINE: str | None = EXCEL_ENGINE,
+) -> pd.DataFrame:
+    """Reads the sheet of one Excel file with the table's columns and dtypes, logging parse time and memory.
+
+    Args:
+        file_path (Path): Path to the Excel file.
+        SHEET (str): Name of the sheet.
+        SKIP (int, optional): Number of rows to skip at the beginning of the sheet. Defaults to 0.
+        COL_NAMES (list[str] | None, optional): Column names of the sheet. Defaults to None.
+        USECOLS (list[str] | None, optional): Subset of COL_NAMES to parse. Defaults to None.
+        DTYPE (dict[str, str] | None, optional): Column dtypes keyed by COL_NAMES. Defaults to None.
+        ENGINE (str | None, optional): Preferred Excel engine. Defaults to EXCEL_ENGINE.
+
+    Returns:
+        pd.DataFrame: The sheet.
+    """
+    engine = resolve_excel_engine(ENGINE)
+    usecols, names, dtype = select_columns(COL_NAMES, USECOLS, DTYPE)
+
+    start_time = time.time()
+    with pd.ExcelFile(file_path, engine=engine) as xls:
+        data = pd.read_excel(xls, sheet_name=SHEET, skiprows=SKIP, usecols=usecols, names=names, dtype=dtype)
+    logger.info(
+        f"parsed {len(data)} rows x {len(data.columns)} cols in {time.time() - start_time:.2f}s "
+        f"| {data.memory_usage(deep=True).sum() / 2**20:.1f} MB | {engine}"
+    )
+    return data
+
 # Function to read Excel files
 @exception
 @log_function_execution
-def read_excel_files(FOLDER_PATH_IN: Path, FOLDER_PATH_OUT: Path, SHEET: str, SKIP: int = 0, COL_NAMES: list[str] | None = None,) -> pd.DataFrame | None:
+def read_excel_files(
+    FOLDER_PATH_IN: Path,
+    FOLDER_PATH_REJECTED: Path,
+    SHEET: str,
+    SKIP: int = 0,
+    COL_NAMES: list[str] | None = None,
+    USECOLS: list[str] | None = None,
+    DTYPE: dict[str, str] | None = None,
+    ENGINE: str | None = EXCEL_ENGINE,
+) -> tuple[pd.DataFrame, list[tuple[str, int]]] | None:
     """Reads Excel files from a folder and combines them into a single DataFrame.
 
+    The whole folder is read before anything is moved: files stay in the input folder until
+    archive_processed_files runs after a successful load. A file that can't be read or whose days
+    can't be parsed is moved to folder_path_rejected, so it does not block the next runs.
+
     Args:
         folder_path_in (Path): Path to the folder containing Excel files.
-        folder_path_out (Path): Path to the folder where processed files are moved.
+        folder_path_rejected (Path): Path to the folder where unreadable files are moved.
         sheet_name (str): Name of the sheet to read from each Excel file.
         skiprows (int, optional): Number of rows to skip at the beginning of each sheet. Defaults to 0.
         col_names (list[str], optional): List of column names to use for the resulting DataFrame. Defaults to None.
+        usecols (list[str], optional): Subset of col_names to parse, the rest of the sheet is skipped. Defaults to None.
+        dtype (dict[str, str], optional): Column dtypes keyed by col_names. Defaults to None.
+        engine (str, optional): Preferred Excel engine, openpyxl is used if it is not installed. Defaults to EXCEL_ENGINE.
 
     Returns:
-        pd.DataFrame | None: The combined DataFrame if files were read successfully, otherwise None.
+        tuple[pd.DataFrame, list[tuple[str, int]]] | None: The combined DataFrame with parsed days and the
+        files it was read from with their row counts, in order; None if no file was read.
     """
 
     if not os.path.exists(FOLDER_PATH_IN):
@@ -97,24 +208,66 @@ def read_excel_files(FOLDER_PATH_IN: Path, FOLDER_PATH_OUT: Path, SHEET: str, SK
         logger.info("no Excel files found in the input folder.")
         return None
     
-    file_list = os.listdir(FOLDER_PATH_IN)
-    dfs = []
+    dfs, files = [], []
     for file in file_list:
         file_path = os.path.join(FOLDER_PATH_IN, file)
         logger.info(f"processing file: {file}")
-        with pd.ExcelFile(file_path) as xls:
-            data = pd.read_excel(xls, sheet_name=SHEET, skiprows=SKIP, names=COL_NAMES)
-            dfs.append(data)
-        # Moving the file after processing
-        move_processed_file(file_path, FOLDER_PATH_OUT, file)
+        try:
+            data = read_excel_file(file_path, SHEET, SKIP, COL_NAMES, USECOLS, DTYPE, ENGINE)
+            if 'Day' in data.columns:
+                data['Day'] = parse_days(data['Day'])
+        except Exception as e:
+            # A broken file is set aside instead of failing the batch on every run
+            logger.error(f"file {file} rejected: {e}")
+            move_processed_file(file_path, FOLDER_PATH_REJECTED, file)
+            continue
+        dfs.append(data)
+        files.append((file, len(data)))
     
     # Check if the list is not empty    
     if dfs:
         df = pd.concat(dfs, ignore_index=True)
-        return df
+        return df, files
     else:
         logger.info("no data read from the files.")
         return None
+
+# Function to archive the files of a loaded batch
+@exception
+@log_function_execution
+def archive_processed_files(
+    df: pd.DataFrame,
+    files: list[tuple[str, int]],
+    FOLDER_PATH_IN: Path,
+    FOLDER_PATH_OUT: Path,
+    ARCHIVE_MODE: str = ARCHIVE_MODE,
+) -> None:
+    """Archives the files of a batch once its rows are loaded, then moves (or drops) the workbooks.
+
+    Args:
+        df (pd.DataFrame): The combined DataFrame returned by read_excel_files.
+        files (list[tuple[str, int]]): The files and row counts returned by read_excel_files.
+        folder_path_in (Path): Path to the folder containing the Excel files.
+        folder_path_out (Path): Path to the archive folder.
+        archive_mode (str, optional): What is kept in folder_path_out: 'xlsx', 'parquet' or 'both'. Defaults to ARCHIVE_MODE.
+    """
+
+    start = 0
+    for file, rows in files:
+        file_path = os.path.join(FOLDER_PATH_IN, file)
+        archived = archive_frame(
+            df.iloc[start:start + rows],
+            FOLDER_PATH_OUT,
+            file,
+            PARQUET=ARCHIVE_MODE != 'xlsx',
+            XLSX=ARCHIVE_MODE != 'parquet'
+        )
+        start += rows
+        # The workbook is only dropped once its Parquet copy is safely written
+        if ARCHIVE_MODE == 'parquet' and archived:
+            os.remove(file_path)
+        else:
+            move_processed_file(file_path, FOLDER_PATH_OUT, file)
     
 # Function to move file to archive folder
 @exception
@@ -161,15 +314,99 @@ def load_excel_sheets(DICT_PATH: Path, LIST_OF_SHEETS: list[str]) -> dict[str, p
         sheets_data[sheet] = pd.read_excel(DICT_PATH, sheet_name=sheet)
     return sheets_data
 
+# Function to normalize the 'Day' column
+def parse_days(days: pd.Series, FORMAT: str = DAY_FORMAT) -> pd.Series:
+    """Converts the 'Day' values of the exports (e.g. 'Mon, 01.07.2024' -> 2024-07-01, or datetimes) to dates.
+
+    Text days are parsed with an explicit FORMAT, so a day in another format fails the batch instead
+    of being read with swapped day and month. Only blank cells and subtotal rows (SUBTOTAL_PATTERN)
+    become NaT; they are caught by validation.
+
+    Args:
+        days (pd.Series): The raw 'Day' column.
+        FORMAT (str, optional): strptime format of the text days after the weekday is cut off. Defaults to DAY_FORMAT.
+
+    Returns:
+        pd.Series: The column as datetime.date values.
+
+    Raises:
+        ValueError: If a text day does not match FORMAT.
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(days):
+        return days.dt.date
+
+    values = days.astype(object)
+    is_text = values.map(lambda value: isinstance(value, str)).astype(bool)
+    text = values[is_text].astype('string')
+    skip = text.str.strip().eq('') | text.str.contains(SUBTOTAL_PATTERN, regex=True)
+
+    parsed = pd.Series(pd.NaT, index=days.index, dtype='datetime64[ns]')
+    parsed[~is_text] = pd.to_datetime(values[~is_text])
+    parsed[text.index[~skip]] = pd.to_datetime(
+        text[~skip].str[-10:].str.replace(',', '').str.replace(' ', ''),
+        format=FORMAT
+    )
+    return parsed.dt.date
+
+# Function to bring key values to one text form
+def key_strings(values: pd.Series) -> pd.Series:
+    """Converts key values to strings that do not depend on the dtype the column was read with.
+
+    The same key can arrive as int, float (when the column has blanks) or text in different exports:
+    101, 101.0 and '101' all become '101', dates and midnight timestamps become ISO dates.
+
+    Args:
+        values (pd.Series): A key column.
+
+    Returns:
+        pd.Series: The values as 'string' dtype, missing values as <NA>.
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y-%m-%d').astype('string')
+    return (
+        values.astype('string')
+        .str.strip()
+        .str.replace(r'^(-?\d+)\.0+$', r'\1', regex=True)
+        .str.replace(r'^(\d{4}-\d{2}-\d{2}) 00:00:00$', r'\1', regex=True)
+    )
+
+# Function to hash natural keys of rows
+def add_row_hash(df: pd.DataFrame, KEY_COLS: list[str]) -> pd.DataFrame:
+    """Adds a 64-bit hash of the natural key of each row and drops rows repeating a key.
+
+    The key columns are hashed in their key_strings form, so a key hashes the same whatever dtype
+    the export was read with. When the same key arrives several times (overlapping exports),
+    the last row read wins.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing KEY_COLS.
+        KEY_COLS (list[str]): Columns that identify a row.
+
+    Returns:
+        pd.DataFrame: The deduplicated DataFrame with the ROW_HASH_COL column.
+    """
+
+    keys = pd.DataFrame({col: key_strings(df[col]) for col in KEY_COLS})
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    # Postgres has no unsigned bigint, so the hash is stored as a signed one
+    df = df.assign(**{ROW_HASH_COL: hashes.view('int64')})
+    deduplicated = df.drop_duplicates(subset=ROW_HASH_COL, keep='last')
+    if len(deduplicated) < len(df):
+        logger.info(f"dropped {len(df) - len(deduplicated)} duplicated rows")
+    return deduplicated
+
 # Function to process data
 @exception
 @log_function_execution
-def process_data(df: pd.DataFrame | None, COMPANIES: list[str]) -> pd.DataFrame | None:
+def process_data(df: pd.DataFrame | None, COMPANIES: list[str], KEY_COLS: list[str] | None = None) -> pd.DataFrame | None:
     """Processes a DataFrame by cleaning 'Day' column, filtering companies, and converting columns to lowercase snake_case.
 
     Args:
         df (pd.DataFrame | None): The DataFrame to process.
         companies (list[str]): List of company names to filter the DataFrame.
+        key_cols (list[str], optional): Natural key columns; when given, rows are hashed and deduplicated by them. Defaults to None.
 
     Returns:
         pd.DataFrame | None: The processed DataFrame, or None if the input DataFrame is empty.
@@ -178,11 +415,10 @@ def process_data(df: pd.DataFrame | None, COMPANIES: list[str]) -> pd.DataFrame
     if df is None or df.empty:
         return df
 
-    if df['Day'].dtype == 'O':
-        df['Day'] = df['Day'].str[-10:].str.replace(',', '').str.replace(' ', '')
-
-    df["Day"] = pd.to_datetime(df["Day"]).dt.date
+    df["Day"] = parse_days(df["Day"])
     df = df.loc[df['Company'].isin(COMPANIES)]
+    if KEY_COLS:
+        df = add_row_hash(df, KEY_COLS)
     df.columns = df.columns.str.lower().str.replace(' ', '_')
     return df
 
@@ -310,6 +546,75 @@ def delete_existing_data(engine: sqlalchemy.engine.Engine, session: sqlalchemy.o
         session.execute(delete_stmt)
         session.commit()
 
+# Function to build a scoped WHERE clause
+def scope_clause(SCOPE: tuple[str, str] | None) -> tuple[str, dict]:
+    """Returns an extra condition restricting a statement to one shard, e.g. ('company', 'RU').
+
+    Args:
+        SCOPE (tuple[str, str] | None): Column and value of the shard, or None for the whole table.
+
+    Returns:
+        tuple[str, dict]: The SQL condition (starting with AND) and its parameters.
+    """
+
+    if SCOPE is None:
+        return '', {}
+    return f' AND "{SCOPE[0]}" = :scope', {'scope': SCOPE[1]}
+
+# Function to report memory usage of the process
+def process_memory_mb() -> float | None:
+    """Returns the resident memory of the current process in MB, or None if psutil is not installed."""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / 2**20
+
+# Function to replace table data in memory-bounded chunks
+@exception
+@log_function_execution
+def replace_data_chunked(df: pd.DataFrame, engine: sqlalchemy.engine.Engine, name: str, CHUNKSIZE: int = 10000, MAX_MEMORY_MB: int = MAX_MEMORY_MB) -> int:
+    """Replaces the contents of a table by streaming the DataFrame in fixed-size batches inside one transaction.
+
+    The old rows are only gone once every chunk is written; any failure rolls the table back.
+    Progress (rows per second, ETA and process memory) is logged per chunk, and the chunk size is
+    halved while the process is above MAX_MEMORY_MB.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to load.
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table to replace.
+        CHUNKSIZE (int, optional): Rows per batch. Defaults to 10000.
+        MAX_MEMORY_MB (int, optional): Memory limit for the process. Defaults to MAX_MEMORY_MB.
+
+    Returns:
+        int: Number of rows written.
+    """
+
+    total = len(df)
+    done, peak = 0, 0.0
+    start_time = time.time()
+
+    with engine.begin() as conn:
+        if sqlalchemy.inspect(conn).has_table(name):
+            conn.execute(text(f'DELETE FROM {name}'))
+
+        while done < total:
+            chunk = df.iloc[done:done + CHUNKSIZE]
+            chunk.to_sql(name, conn, if_exists='append', index=False)
+            done += len(chunk)
+
+            elapsed = time.time() - start_time
+            rate = done / elapsed if elapsed else 0
+            eta = (total - done) / rate if rate else 0
+            memory = process_memory_mb()
+            peak = max(peak, memory or 0)
+            memory_str = f" | {memory:.0f} MB (peak {peak:.0f} MB)" if memory is not None else ''
+            logger.info(f"{name}: {done}/{total} rows | {rate:.0f} rows/s | ETA {eta:.0f}s{memory_str}")
+
+            if memory is not None and memory > MAX_MEMORY_MB and CHUNKSIZE > 1000:
+                CHUNKSIZE //= 2
+                logger.warning(f"memory above {MAX_MEMORY_MB} MB, chunk size reduced to {CHUNKSIZE}")
+    return done
+
 # Function to load data to database
 @exception
 @log_function_execution
@@ -321,25 +626,252 @@ def load_data_to_db(df: pd.DataFrame, engine: sqlalchemy.engine.Engine, session:
         engine (sqlalchemy.engine.Engine): The database engine object.
         name (str): Name of the table to load data into.
         IF_EXISTS (str): How to handle existing data in the table ('replace', 'append', or 'fail').
+        CHUNKSIZE (int, optional): Rows per insert batch. Defaults to 10000.
     """
     
+    if df is None or df.empty:
+        logger.info("no data to load.")
+        return
+
+    # 'replace' keeps the table definition and swaps its rows chunk by chunk in one transaction
+    if IF_EXISTS == 'replace':
+        replace_data_chunked(df, engine, name, CHUNKSIZE)
+        return
+
     with engine.connect() as conn:
-        if IF_EXISTS == 'replace':
-            IF_EXISTS = 'append'
-            if df is not None or not df.empty:
-                delete_existing_data(engine, session, name)
-            
         df.to_sql(name, conn, if_exists=IF_EXISTS, index=False, chunksize=CHUNKSIZE)
 
+# Function to prepare a table for upserts
+@exception
+def prepare_upsert_table(engine: sqlalchemy.engine.Engine, name: str) -> bool:
+    """Adds the ROW_HASH_COL column and its unique index to a table if they are missing.
+
+    Runs in its own short transaction, so parallel loads don't queue behind the DDL locks.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table.
+
+    Returns:
+        bool: True when the table is ready.
+    """
+
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {name} ADD COLUMN IF NOT EXISTS {ROW_HASH_COL} bigint'))
+        conn.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS {name}_{ROW_HASH_COL}_uq ON {name} ({ROW_HASH_COL})'))
+    return True
+
+# Function to upsert data by natural-key hash
+@exception
+@log_function_execution
+def upsert_data_to_db(df: pd.DataFrame | None, engine: sqlalchemy.engine.Engine, name: str, CHUNKSIZE: int = 10000, SCOPE: tuple[str, str] | None = None, PREPARE: bool = True) -> int:
+    """Inserts new rows and updates existing ones by ROW_HASH_COL, so reloading the same data is idempotent.
+
+    The rows are staged in a temporary table and merged with INSERT ... ON CONFLICT against a unique index
+    on ROW_HASH_COL. Rows loaded before hashing was introduced (ROW_HASH_COL is NULL) are removed for the
+    loaded days, everything runs in one transaction.
+
+    Args:
+        df (pd.DataFrame | None): The processed DataFrame with the ROW_HASH_COL column.
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table to load data into.
+        CHUNKSIZE (int, optional): Rows per insert batch into the staging table. Defaults to 10000.
+        SCOPE (tuple[str, str] | None, optional): Shard column and value the legacy-row delete is limited to. Defaults to None.
+        PREPARE (bool, optional): Whether to create the hash column and index first. Defaults to True.
+
+    Returns:
+        int: Number of rows inserted or updated.
+    """
+
+    if df is None or df.empty:
+        logger.info("no data to upsert.")
+        return 0
+
+    if PREPARE and not prepare_upsert_table(engine, name):
+        raise ValueError(f"table {name} is not prepared for upserts")
+
+    staging = f"{name}_staging"
+    columns = ', '.join(f'"{col}"' for col in df.columns)
+    updates = ', '.join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col != ROW_HASH_COL)
+    scope_sql, scope_params = scope_clause(SCOPE)
+
+    with engine.begin() as conn:
+        conn.execute(
+            text(f'DELETE FROM {name} WHERE day = ANY(:keys) AND {ROW_HASH_COL} IS NULL{scope_sql}'),
+            {'keys': list(df['day'].unique()), **scope_params}
+        )
+        conn.execute(text(f'CREATE TEMP TABLE {staging} (LIKE {name} INCLUDING DEFAULTS) ON COMMIT DROP'))
+        df.to_sql(staging, conn, if_exists='append', index=False, chunksize=CHUNKSIZE)
+        result = conn.execute(text(
+            f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {staging} '
+            f'ON CONFLICT ({ROW_HASH_COL}) DO UPDATE SET {updates}'
+        ))
+        logger.info(f"upserted {result.rowcount} rows into {name}")
+    return result.rowcount
+
+# Function to delete the loaded days of a shard and append its rows
+@exception
+@log_function_execution
+def replace_days_scoped(df: pd.DataFrame, engine: sqlalchemy.engine.Engine, name: str, CHUNKSIZE: int = 10000, SCOPE: tuple[str, str] | None = None, DAYS: list | None = None) -> int:
+    """Deletes the days present in the DataFrame (limited to the shard) and appends the rows, in one transaction.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to load.
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table to load data into.
+        CHUNKSIZE (int, optional): Rows per insert batch. Defaults to 10000.
+        SCOPE (tuple[str, str] | None, optional): Shard column and value the delete is limited to. Defaults to None.
+        DAYS (list | None, optional): Days to delete, e.g. every day a backfill covers. Defaults to the days of the DataFrame.
+
+    Returns:
+        int: Number of rows appended.
+    """
+
+    scope_sql, scope_params = scope_clause(SCOPE)
+    with engine.begin() as conn:
+        if sqlalchemy.inspect(conn).has_table(name):
+            conn.execute(
+                text(f'DELETE FROM {name} WHERE day = ANY(:keys){scope_sql}'),
+                {'keys': list(df['day'].unique()) if DAYS is None else list(DAYS), **scope_params}
+            )
+        df.to_sql(name, conn, if_exists='append', index=False, chunksize=CHUNKSIZE)
+    return len(df)
+
+# Function to name the partition of a shard
+def partition_name(name: str, shard_key: str) -> str:
+    """Returns the name of the per-shard partition, e.g. ('sales', 'Guess CIS') -> 'sales_guess_cis'."""
+    return f"{name}_{re.sub(r'[^0-9a-z]+', '_', shard_key.lower()).strip('_')}"
+
+# Function to create the partition of a shard
+@exception
+def ensure_partition(engine: sqlalchemy.engine.Engine, name: str, shard_key: str) -> str:
+    """Creates the list partition of a shard if it does not exist. The parent table must be partitioned by the shard column.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the partitioned parent table.
+        shard_key (str): Value of the shard column.
+
+    Returns:
+        str: Name of the partition.
+    """
+
+    partition = partition_name(name, shard_key)
+    value = shard_key.replace("'", "''")
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {name} FOR VALUES IN ('{value}')"))
+    return partition
+
+# Function to split a DataFrame into shards
+def shard_frame(df: pd.DataFrame, SHARD_BY: str) -> dict[str, pd.DataFrame]:
+    """Splits a DataFrame by the values of a column (company or country).
+
+    Args:
+        df (pd.DataFrame): The processed DataFrame.
+        SHARD_BY (str): Column to shard by.
+
+    Returns:
+        dict[str, pd.DataFrame]: Shards keyed by the column value.
+    """
+
+    return {str(key): shard for key, shard in df.groupby(SHARD_BY, sort=False, observed=True)}
+
+# Function to load one shard
+def load_shard(shard: pd.DataFrame, engine: sqlalchemy.engine.Engine, name: str, shard_key: str, SHARD_BY: str, LOAD_MODE: str, PARTITIONED: bool, CHUNKSIZE: int) -> int | None:
+    """Loads one shard into the table (or its partition), scoping every delete to the shard.
+
+    Returns:
+        int | None: Rows written, or None if the load failed.
+    """
+
+    target = name
+    scope = (SHARD_BY, shard_key)
+    if PARTITIONED:
+        target = ensure_partition(engine, name, shard_key)
+        if target is None:
+            return None
+        if LOAD_MODE == 'upsert' and not prepare_upsert_table(engine, target):
+            return None
+
+    if LOAD_MODE == 'upsert':
+        return upsert_data_to_db(shard, engine, target, CHUNKSIZE, scope, PREPARE=False)
+    return replace_days_scoped(shard, engine, target, CHUNKSIZE, scope)
+
+# Function to load a table shard by shard in parallel
+@exception
+@log_function_execution
+def load_data_sharded(
+    df: pd.DataFrame | None,
+    engine: sqlalchemy.engine.Engine,
+    name: str,
+    SHARD_BY: str,
+    LOAD_MODE: str = 'delete',
+    IF_EXISTS: str = 'append',
+    PARTITIONED: bool = False,
+    CHUNKSIZE: int = 10000,
+    WORKERS: int = SHARD_WORKERS,
+) -> list[str]:
+    """Splits a DataFrame by company/country and loads the shards in parallel, each on its own connection and transaction.
+
+    Deletes are limited to the shard: 'upsert' tables drop only the shard's legacy rows, other tables
+    delete the shard's loaded days. With PARTITIONED, each shard goes straight into its list partition
+    of the table. 'replace' tables are never sharded: a shard missing from the new snapshot would keep
+    its old rows, and a failed shard would leave a mixed snapshot.
+
+    Args:
+        df (pd.DataFrame | None): The processed DataFrame.
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table to load data into.
+        SHARD_BY (str): Column to shard by, e.g. 'company'.
+        LOAD_MODE (str, optional): 'delete' or 'upsert'. Defaults to 'delete'.
+        IF_EXISTS (str, optional): 'append'; 'replace' tables are refused. Defaults to 'append'.
+        PARTITIONED (bool, optional): Whether to load into per-shard partitions. Defaults to False.
+        CHUNKSIZE (int, optional): Rows per insert batch. Defaults to 10000.
+        WORKERS (int, optional): Number of parallel workers. Defaults to SHARD_WORKERS.
+
+    Returns:
+        list[str]: Keys of the shards that were loaded.
+    """
+
+    if df is None or df.empty:
+        logger.info("no data to load.")
+        return []
+
+    if IF_EXISTS == 'replace':
+        logger.error(f"{name}: 'replace' tables are loaded as one snapshot and can't be sharded")
+        return []
+
+    if LOAD_MODE == 'upsert' and not PARTITIONED and not prepare_upsert_table(engine, name):
+        return []
+
+    shards = shard_frame(df, SHARD_BY)
+    loaded = []
+    with ThreadPoolExecutor(max_workers=min(WORKERS, len(shards))) as executor:
+        futures = {
+            executor.submit(load_shard, shard, engine, name, key, SHARD_BY, LOAD_MODE, PARTITIONED, CHUNKSIZE): key
+            for key, shard in shards.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            if future.result() is None:
+                logger.error(f"{name}: shard '{key}' failed to load")
+            else:
+                logger.info(f"{name}: shard '{key}' loaded ({len(shards[key])} rows)")
+                loaded.append(key)
+    return loaded
+
 # Function to transform and load dict data to database  
 @exception 
 @log_function_execution
-def transform_and_load_dict(engine: sqlalchemy.engine.Engine, session: sqlalchemy.orm.Session, dfs: dict[str, pd.DataFrame]) -> None:
+def transform_and_load_dict(engine: sqlalchemy.engine.Engine, session: sqlalchemy.orm.Session, dfs: dict[str, pd.DataFrame]) -> bool:
     """Transforms and loads data from a dictionary of DataFrames into a database.
 
     Args:
         engine (sqlalchemy.engine.Engine): The database engine object.
         dfs (dict[str, pd.DataFrame]): A dictionary containing DataFrames with sheet names as keys.
+
+    Returns:
+        bool: True when every sheet was loaded.
     """
     
     with engine.connect() as conn:
@@ -353,6 +885,7 @@ def transform_and_load_dict(engine: sqlalchemy.engine.Engine, session: sqlalchem
             # Load DataFrame into the database
             # with session.begin():
             df.to_sql(table_name, conn, if_exists='append', index=False)
+    return True
 
 # Function to refresh materialized views
 @exception 
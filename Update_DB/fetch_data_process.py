@@ -1,10 +1,8 @@
 from datetime import datetime, timedelta
 
-from selenium.webdriver.support.ui import WebDriverWait
-
 from db_config import LOGIN, PASSWORD
 from logging_config import logger, log_function_execution
-from params import BASE_URL, DATA, MAX_WAIT_TIME
+from params import BASE_URL, DATA
 from raw_data_fetch import (
     create_driver,
     execute_actions,
@@ -12,6 +10,7 @@ from raw_data_fetch import (
     get_dates_to_process,
     process_date
 )
+from wait_strategy import telemetry
 
 
 @log_function_execution
@@ -25,23 +24,25 @@ def fetch_external_data(
     base_date = datetime.now() - timedelta(days=1)
     
     driver = create_driver(download_path)
+    # Timeouts of this run start from the latencies observed in earlier runs
+    telemetry.load()
     
     try:
         driver.get(BASE_URL)
-        wait = WebDriverWait(driver, MAX_WAIT_TIME)
         
         # Authorization
         auth_actions = get_authorization_actions(LOGIN, PASSWORD)
-        execute_actions(wait, auth_actions)
+        execute_actions(driver, auth_actions)
         
         # Date Processing
         dates = get_dates_to_process(base_date)
-        for index, date in enumerate(dates):
+        for date in dates:
             logger.info(f"processing date: {date.day:02d}.{date.month:02d}.{date.year}")
-            process_date(driver, wait, download_path, date, index)
+            process_date(driver, download_path, date)
     
     finally:
         driver.quit()
+        telemetry.save()
         # logger.info("function fetch sexternal data executed")
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+from logging_config import logger
+
+# Guards read-modify-write of the cache files when stages run in parallel threads
+CACHE_LOCK = threading.RLock()
+
+
+# Function to read a JSON cache file
+def read_json(path: Path, default: dict) -> dict:
+    """Reads a JSON file, returning the default when the file does not exist or is broken.
+
+    Args:
+        path (Path): Path to the JSON file.
+        default (dict): Value returned when the file can't be read.
+
+    Returns:
+        dict: The file contents.
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"can't read cache file '{path}': {e}")
+        return default
+
+# Function to write a JSON cache file
+def write_json(path: Path, data: dict) -> None:
+    """Writes a JSON file atomically, creating its folder if needed.
+
+    Args:
+        path (Path): Path to the JSON file.
+        data (dict): The data to write.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, default=str)
+    os.replace(tmp_path, path)
@@ -0,0 +1,145 @@
+from datetime import date
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+from exception_config import exception
+from logging_config import logger, log_function_execution
+from params import LOOKUPS
+
+
+# Function to normalize lookup keys
+def normalize_key(values: pd.Series) -> pd.Series:
+    """Brings key values to a common type: datetimes become dates, everything else becomes strings.
+
+    Args:
+        values (pd.Series): Key column of a lookup sheet or of the data.
+
+    Returns:
+        pd.Series: The normalized key column.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.date
+    sample = values.dropna()
+    if values.dtype == 'O' and len(sample) and isinstance(sample.iloc[0], date):
+        return pd.to_datetime(values).dt.date
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype('Int64')
+    return values.astype('string').str.strip()
+
+# Function to build in-memory lookups from the dict sheets
+@exception
+@log_function_execution
+def build_lookups(dicts: dict[str, pd.DataFrame], LOOKUPS: dict[str, dict] = LOOKUPS) -> dict[str, pd.DataFrame]:
+    """Builds lookup tables indexed by their keys (date, store, ...) from the sheets of Mapping.xlsx.
+
+    A lookup can be built from several sheets (e.g. the old and the new fiscal calendar): they are
+    stacked in the listed order, so a later sheet wins the keys both of them have.
+
+    Args:
+        dicts (dict[str, pd.DataFrame]): Sheets loaded by load_excel_sheets.
+        LOOKUPS (dict[str, dict], optional): Sheet, key columns and value columns of each lookup. Defaults to LOOKUPS.
+
+    Returns:
+        dict[str, pd.DataFrame]: Lookup tables with a unique (Multi)Index over the key columns.
+    """
+    lookups = {}
+    for name, lookup in LOOKUPS.items():
+        sheet_names = lookup["SHEET"] if isinstance(lookup["SHEET"], list) else [lookup["SHEET"]]
+        sheets = []
+        for sheet_name in sheet_names:
+            if dicts.get(sheet_name) is None:
+                logger.warning(f"lookup {name}: sheet '{sheet_name}' is not loaded")
+            else:
+                sheets.append(dicts[sheet_name].rename(columns=str.lower))
+        if not sheets:
+            continue
+
+        sheet = pd.concat(sheets, ignore_index=True)
+        keys = [col.lower() for col in lookup["KEY"]]
+        cols = [col.lower() for col in lookup["COLS"] if col.lower() in sheet.columns]
+        missing = [key for key in keys if key not in sheet.columns]
+        if missing or not cols:
+            logger.warning(f"lookup {name}: sheet '{lookup['SHEET']}' has no columns {missing or lookup['COLS']}")
+            continue
+
+        table = sheet[keys + cols].dropna(subset=keys)
+        table = table.assign(**{key: normalize_key(table[key]) for key in keys})
+        lookups[name] = table.drop_duplicates(subset=keys, keep='last').set_index(keys)[cols]
+        logger.info(f"lookup {name}: {len(lookups[name])} keys, columns {cols}")
+    return lookups
+
+# Function to enrich data with lookup columns
+@exception
+@log_function_execution
+def enrich_data(df: pd.DataFrame | None, lookups: dict[str, pd.DataFrame] | None, ENRICH: dict[str, list[str]]) -> pd.DataFrame | None:
+    """Adds lookup columns (fiscal calendar, store attributes, comp flags) to the data by vectorized index lookups.
+
+    Lookups are applied in the order of ENRICH, so a later lookup can use columns added by an earlier one
+    (e.g. comp flags keyed by store and fiscal year). Columns the data already has are not overwritten.
+
+    Args:
+        df (pd.DataFrame | None): The processed DataFrame.
+        lookups (dict[str, pd.DataFrame] | None): Lookup tables from build_lookups.
+        ENRICH (dict[str, list[str]]): Lookup name -> data columns matched against the lookup key.
+
+    Returns:
+        pd.DataFrame | None: The enriched DataFrame.
+    """
+    if df is None or df.empty or not lookups:
+        return df
+
+    for name, frame_keys in ENRICH.items():
+        table = lookups.get(name)
+        if table is None or any(key not in df.columns for key in frame_keys):
+            logger.warning(f"lookup {name} skipped: no lookup or no columns {frame_keys}")
+            continue
+
+        keys = [normalize_key(df[key]) for key in frame_keys]
+        index = pd.MultiIndex.from_arrays(keys) if len(keys) > 1 else pd.Index(keys[0])
+        matched = table.reindex(index)
+        cols = [col for col in table.columns if col not in df.columns]
+        df = df.assign(**{col: matched[col].to_numpy() for col in cols})
+
+        unmatched = int(matched.isna().all(axis=1).sum())
+        if unmatched:
+            logger.warning(f"lookup {name}: {unmatched} of {len(df)} rows have no match")
+    return df
+
+# Function to map a pandas dtype to a Postgres column type
+def sql_type(values: pd.Series) -> str:
+    """Returns the Postgres type for a new column holding the given values."""
+    if pd.api.types.is_bool_dtype(values):
+        return 'boolean'
+    if pd.api.types.is_integer_dtype(values):
+        return 'bigint'
+    if pd.api.types.is_float_dtype(values):
+        return 'double precision'
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'timestamp'
+    return 'text'
+
+# Function to add enriched columns to a table
+@exception
+@log_function_execution
+def ensure_columns(engine: sqlalchemy.engine.Engine, name: str, df: pd.DataFrame | None) -> None:
+    """Adds the DataFrame columns a table does not have yet, so enriched data can be appended.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table.
+        df (pd.DataFrame | None): The enriched DataFrame.
+    """
+    if df is None or df.empty:
+        return
+
+    with engine.begin() as conn:
+        inspector = sqlalchemy.inspect(conn)
+        if not inspector.has_table(name):
+            return
+        existing = {col["name"] for col in inspector.get_columns(name)}
+        for col in df.columns:
+            if col not in existing:
+                logger.info(f"adding column {name}.{col}")
+                conn.execute(text(f'ALTER TABLE {name} ADD COLUMN IF NOT EXISTS "{col}" {sql_type(df[col])}'))
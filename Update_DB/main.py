@@ -1,33 +1,51 @@
+import argparse
+import asyncio
+import sys
+from datetime import date
 
+from backfill import BackfillError, backfill
 from db_update import (
     create_db_engine,
     create_ssh_tunnel,
-    delete_intersections,
     distrib_files_to_target_dirs,
-    get_intersections,
     load_excel_sheets,
-    load_data_to_db,
-    process_data,
-    read_excel_files,
-    refresh_materialized_views,
-    transform_and_load_dict,
     sessionmaker
 )
 from fetch_data_process import fetch_external_data
 from logging_config import logger, log_function_execution
+from lookups import build_lookups
+from orchestrator import run_pipeline
+from pipeline import finish_run, process_table
+from planner import print_plan
+from reconcile import ReconciliationError
 from params import (
+    BACKFILL_TABLES,
     DATA,
     DICT_PATH,
     LIST_OF_SHEETS,
     RAW_DATA_PATH,
-    TARGET_KEYS,
-    MAT_VIEWS
+    TARGET_KEYS
 )
 
       
 # Main function
 @log_function_execution
-def main():
+def main(plan: bool = False, concurrent: bool = False, backfill_range: list[date] | None = None, tables: list[str] | None = None):
+    
+    # Dry run: only estimate the work, nothing is moved or written
+    if plan:
+        print_plan()
+        return
+    
+    # Rebuild a date range from the archive instead of loading new files
+    if backfill_range:
+        backfill(*backfill_range, tables)
+        return
+    
+    # Scrape, distribution and loads overlapped; only the sales load waits for the scrape
+    if concurrent:
+        asyncio.run(run_pipeline())
+        return
     
     fetch_external_data(DATA["sales"]["FOLDER_PATH_IN"])
     # Distribute files from the raw data path to the target directories based on the specified keys  
@@ -43,43 +61,42 @@ def main():
         Session = sessionmaker(bind=engine)
     
         with Session() as session:
-            # Iterate over dictionary items
-            for table_name, table_info in DATA.items():  
-                logger.info(f"processing table: {table_name}")
+            changed_tables = set()
             
-                # Read Excel files
-                df = read_excel_files(
-                                    table_info["FOLDER_PATH_IN"], 
-                                    table_info["FOLDER_PATH_OUT"], 
-                                    table_info["SHEET"], 
-                                    table_info["SKIP"], 
-                                    table_info["COL_NAMES"]
-                                    )
-
-                # Process data
-                df = process_data(df, table_info["COMPANIES"])
-                                
-                # Create intersections
-                intersection_df = get_intersections(engine, df)
-                
-                # Remove intersections from the database
-                delete_intersections(session, intersection_df, table_name)
-                
-                # Load data to database
-                load_data_to_db(df, engine, session, table_name, table_info["IF_EXISTS"], table_info["FOLDER_PATH_IN"])   
-                
-            # Create Dicts 
+            # Create Dicts and the in-memory lookups used to enrich the data
             dicts = load_excel_sheets(DICT_PATH, LIST_OF_SHEETS)
+            lookups = build_lookups(dicts or {})
             
-            #transform and load dicts data to database
-            transform_and_load_dict(engine, session, dicts)
+            # Iterate over dictionary items
+            for table_name, table_info in DATA.items():  
+                if process_table(engine, session, table_name, table_info, lookups):
+                    changed_tables.add(table_name)
             
-            # Refreshing the materialized view
-            for view in MAT_VIEWS:
-                refresh_materialized_views(session, view)
+            # Load changed dicts and refresh the materialized views
+            finish_run(engine, session, dicts, changed_tables)
             
             # End session
             session.commit()
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Update the database with new sales and stock data.")
+    parser.add_argument('--plan', action='store_true', help="print the estimated work of a run without moving or writing anything")
+    parser.add_argument('--concurrent', action='store_true', help="run the scrape, the file distribution and the loads at the same time")
+    commands = parser.add_subparsers(dest='command')
+    backfill_parser = commands.add_parser('backfill', help="reload a date range from the archive, month by month in parallel")
+    backfill_parser.add_argument('--table', nargs='+', choices=BACKFILL_TABLES, help=f"tables to reload (default: {', '.join(BACKFILL_TABLES)}; snapshot tables can't be backfilled)")
+    backfill_parser.add_argument('--from', dest='start', required=True, type=date.fromisoformat, help="first day, YYYY-MM-DD")
+    backfill_parser.add_argument('--to', dest='end', required=True, type=date.fromisoformat, help="last day, YYYY-MM-DD")
+    args = parser.parse_args()
+    if args.command == 'backfill' and args.start > args.end:
+        parser.error(f"--from {args.start} is after --to {args.end}")
+    try:
+        main(
+            plan=args.plan,
+            concurrent=args.concurrent,
+            backfill_range=[args.start, args.end] if args.command == 'backfill' else None,
+            tables=getattr(args, 'table', None)
+        )
+    except (BackfillError, ReconciliationError) as e:
+        logger.error(f"run failed: {e}")
+        sys.exit(1)
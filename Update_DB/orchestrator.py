@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Callable
+
+from db_update import (
+    create_db_engine,
+    create_ssh_tunnel,
+    distrib_files_to_target_dirs,
+    load_excel_sheets,
+    sessionmaker
+)
+from fetch_data_process import fetch_external_data
+from logging_config import logger
+from lookups import build_lookups
+from pipeline import finish_run, process_table
+from params import (
+    CONCURRENT_TABLES,
+    DATA,
+    DICT_PATH,
+    LIST_OF_SHEETS,
+    RAW_DATA_PATH,
+    TARGET_KEYS
+)
+
+# Folder the scraper downloads the TurnoverList files into
+FETCH_FOLDER = DATA["sales"]["FOLDER_PATH_IN"]
+
+
+# Function to run a blocking stage in a worker thread
+async def run_stage(stages: dict[str, dict], name: str, deps: list[str], func: Callable, *args):
+    """Runs a blocking function in the default executor and records when it started and ended.
+
+    Args:
+        stages (dict[str, dict]): Timings of the run, filled in place.
+        name (str): Name of the stage.
+        deps (list[str]): Stages this one waited for.
+        func (Callable): The blocking function.
+        *args: Arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    stages[name] = {"deps": deps, "start": time.perf_counter(), "end": None}
+    try:
+        return await asyncio.to_thread(func, *args)
+    finally:
+        stages[name]["end"] = time.perf_counter()
+
+# Function to find the chain of stages that set the run time
+def critical_path(stages: dict[str, dict]) -> list[str]:
+    """Walks back from the stage that finished last, always through the dependency that finished last.
+
+    Args:
+        stages (dict[str, dict]): Timings of the run from run_stage.
+
+    Returns:
+        list[str]: The stages of the critical path, first to last.
+    """
+    finished = {name: stage for name, stage in stages.items() if stage["end"] is not None}
+    if not finished:
+        return []
+    path = [max(finished, key=lambda name: finished[name]["end"])]
+    while True:
+        deps = [dep for dep in finished[path[-1]]["deps"] if dep in finished]
+        if not deps:
+            return path[::-1]
+        path.append(max(deps, key=lambda dep: finished[dep]["end"]))
+
+# Function to report the timings of a run
+def report_stages(stages: dict[str, dict], origin: float) -> None:
+    """Logs the start, duration and waits of every stage and the critical path of the run.
+
+    Args:
+        stages (dict[str, dict]): Timings of the run from run_stage.
+        origin (float): perf_counter value at the start of the run.
+    """
+    for name, stage in sorted(stages.items(), key=lambda item: item[1]["start"]):
+        end = stage["end"] if stage["end"] is not None else time.perf_counter()
+        # Time between the last dependency finishing and the stage starting (e.g. waiting for a load slot)
+        ready = max([stages[dep]["end"] for dep in stage["deps"] if stages.get(dep, {}).get("end")] or [origin])
+        logger.info(
+            f"stage {name: <16} | start {stage['start'] - origin:7.1f}s | "
+            f"{end - stage['start']:7.1f}s | waited {stage['start'] - ready:5.1f}s"
+        )
+
+    path = critical_path(stages)
+    if path:
+        steps = ' -> '.join(f"{name} ({stages[name]['end'] - stages[name]['start']:.0f}s)" for name in path)
+        logger.info(f"critical path {stages[path[-1]]['end'] - origin:.0f}s: {steps}")
+
+# Function to run the whole update with overlapping stages
+async def run_pipeline() -> set[str]:
+    """Runs the update with its independent stages at the same time.
+
+    The scrape, the distribution of the share files and the tunnel with the dicts start together.
+    Each table is loaded as soon as its files are in place: tables fed from the share wait only
+    for the distribution, the sales table waits for the scrape. At most CONCURRENT_TABLES tables
+    are read and loaded at once. The dicts and the views are handled after all loads, and the
+    critical path of the run is logged at the end.
+
+    Returns:
+        set[str]: Tables that got new rows.
+    """
+    origin = time.perf_counter()
+    stages: dict[str, dict] = {}
+    upstream = {
+        "fetch": asyncio.create_task(run_stage(stages, "fetch", [], fetch_external_data, FETCH_FOLDER)),
+        "distribute": asyncio.create_task(run_stage(stages, "distribute", [], distrib_files_to_target_dirs, RAW_DATA_PATH, TARGET_KEYS)),
+    }
+    sources = {"fetch": {FETCH_FOLDER}, "distribute": set(TARGET_KEYS.values())}
+
+    ssh_tunnel = create_ssh_tunnel()
+    await run_stage(stages, "connect", [], ssh_tunnel.start)
+    try:
+        engine = create_db_engine(ssh_tunnel)
+        Session = sessionmaker(bind=engine)
+        dicts = await run_stage(stages, "dicts", ["connect"], load_excel_sheets, DICT_PATH, LIST_OF_SHEETS)
+        lookups = build_lookups(dicts or {})
+        slots = asyncio.Semaphore(CONCURRENT_TABLES)
+
+        def load(table_name: str, table_info: dict) -> bool:
+            with Session() as session:
+                changed = process_table(engine, session, table_name, table_info, lookups)
+                session.commit()
+                return changed
+
+        async def load_after(table_name: str, table_info: dict) -> bool:
+            deps = [name for name, folders in sources.items() if table_info["FOLDER_PATH_IN"] in folders]
+            for dep in deps:
+                try:
+                    await upstream[dep]
+                except Exception as e:
+                    # Files of a failed stage may be incomplete; they stay in place for the next run
+                    logger.error(f"{table_name} is not loaded: stage {dep} failed: {e}")
+                    return False
+            async with slots:
+                return await run_stage(stages, f"load:{table_name}", deps + ["dicts"], load, table_name, table_info)
+
+        # Every load runs to its end before a failed one (e.g. a reconciliation mismatch) stops the run
+        results = await asyncio.gather(*(load_after(name, info) for name, info in DATA.items()), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+        changed_tables = {name for name, changed in zip(DATA, results) if changed}
+
+        def finish() -> None:
+            with Session() as session:
+                finish_run(engine, session, dicts, changed_tables)
+                session.commit()
+
+        await run_stage(stages, "finish", [f"load:{name}" for name in DATA], finish)
+        for name, result in zip(upstream, await asyncio.gather(*upstream.values(), return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.error(f"stage {name} failed: {result}")
+    finally:
+        await asyncio.to_thread(ssh_tunnel.stop)
+        report_stages(stages, origin)
+    return changed_tables
@@ -1,36 +1,154 @@
 # Parameters for file processings
 BASE_PATH = 'C:\\Users\\dmandree\\OneDrive - Guess Inc\\data_flow'
 
+# Subtotal and total rows of the Excel exports
+SUBTOTAL_PATTERN = r'(?i)^\s*(total|subtotal|grand total|итого)\b'
+
+# Format of the text 'Day' values of the exports once the weekday is cut off ('Mon, 01.07.2024' -> '01.07.2024')
+DAY_FORMAT = '%d.%m.%Y'
+
 DATA = {
     "sales": {
         "FOLDER_PATH_IN": f'{BASE_PATH}\\TL_new',
         "FOLDER_PATH_OUT": f'{BASE_PATH}\\TL_arch',
+        "FOLDER_PATH_REJECTED": f'{BASE_PATH}\\TL_rejected',
         "SHEET": 'TurnoverList',
         "COL_NAMES": ['Day', 'Store', 'Company', 'Open', 'Amount', 'Curr', 'Pcs', 'Rcp', 'People', 'Hours', 'Work', 'Comp:', 'Open_1', 'Amount_1', 'Curr_1', 'Pcs_1', 'Rcp_1', 'People_1', 'Hours_1', 'Work_1'],
         "COMPANIES": ['Guess Kazakhstan', 'Guess CIS'],
+        "USECOLS": None,
+        "DTYPE": {'Store': 'string', 'Company': 'string'},
+        "KEY_COLS": ['Day', 'Store', 'Company'],
         "SKIP": 0,
-        "IF_EXISTS": 'append'
+        "IF_EXISTS": 'append',
+        "LOAD_MODE": 'upsert',
+        "SHARD_BY": None,
+        "PARTITIONED": False,
+        "ENRICH": {"calendar": ['day'], "stores": ['store'], "comp_flags": ['store', 'fin_year']},
+        "RECONCILE": ['amount', 'pcs'],
+        "VALIDATE": {
+            "not_null": ['day', 'store', 'company'],
+            "numeric": ['amount', 'pcs', 'rcp'],
+            "non_negative": ['pcs', 'rcp'],
+            "known": {"store": "stores"},
+            "exclude": {"store": SUBTOTAL_PATTERN}
+        }
     },
     "ms_sales": {
         "FOLDER_PATH_IN": f'{BASE_PATH}\\RTL_new',
         "FOLDER_PATH_OUT": f'{BASE_PATH}\\RTL_arch',
+        "FOLDER_PATH_REJECTED": f'{BASE_PATH}\\RTL_rejected',
         "SHEET": 'RTL50000_by_season_by_store old',
         "COL_NAMES": ['Company', 'Country', 'Day', 'Mfg Season', 'Line Code', 'Gender', 'Dept Group', 'Dept', 'Sub Dept', 'Class', 'Class_1', 'Style', 'Style_1', 'Chain', 'Store', 'Store_1', 'Metrics', 'Ttl Sls Qty', 'TTL Curr Rtl Price €', 'Discount €', 'Ttl Sls €', 'Ttl Cost LC', 'Ttl Sls Trasp Cost LC', 'Ttl Cost €', 'Ttl Sls LC', 'Ttl Sls Trasp Cost €'],
         "COMPANIES": ['RU', 'KZ'],
+        "USECOLS": ['Company', 'Country', 'Day', 'Mfg Season', 'Line Code', 'Gender', 'Dept Group', 'Dept', 'Sub Dept', 'Class', 'Style', 'Chain', 'Store', 'Metrics', 'Ttl Sls Qty', 'TTL Curr Rtl Price €', 'Discount €', 'Ttl Sls €', 'Ttl Cost LC', 'Ttl Sls Trasp Cost LC', 'Ttl Cost €', 'Ttl Sls LC', 'Ttl Sls Trasp Cost €'],
+        "DTYPE": {'Company': 'string', 'Country': 'string', 'Mfg Season': 'string', 'Line Code': 'string', 'Style': 'string', 'Store': 'string', 'Metrics': 'string'},
+        "KEY_COLS": ['Company', 'Country', 'Day', 'Mfg Season', 'Line Code', 'Gender', 'Dept Group', 'Dept', 'Sub Dept', 'Class', 'Style', 'Chain', 'Store', 'Metrics'],
         "SKIP": 3,
-        "IF_EXISTS": 'append'
+        "IF_EXISTS": 'append',
+        "LOAD_MODE": 'upsert',
+        "SHARD_BY": None,
+        "PARTITIONED": False,
+        "ENRICH": {"calendar": ['day'], "stores": ['store'], "comp_flags": ['store', 'fin_year']},
+        "RECONCILE": ['ttl_sls_€', 'ttl_sls_qty'],
+        "VALIDATE": {
+            "not_null": ['day', 'store', 'company', 'style'],
+            "numeric": ['ttl_sls_qty', 'ttl_sls_€', 'ttl_cost_€'],
+            "known": {"store": "stores"},
+            "exclude": {"store": SUBTOTAL_PATTERN, "style": SUBTOTAL_PATTERN}
+        }
     },
     "ms_stock": {
         "FOLDER_PATH_IN": f'{BASE_PATH}\\FNC_new',
         "FOLDER_PATH_OUT": f'{BASE_PATH}\\FNC_arch',
+        "FOLDER_PATH_REJECTED": f'{BASE_PATH}\\FNC_rejected',
         "SHEET": 'FNC03-50001-Margin_stock all st',
         "COL_NAMES": ['Company', 'Day', 'Store', 'Store_1', 'Mfg Season', 'Line Code', 'Line_Code_1', 'Style', 'Style_1', 'Sub_Dept', 'Sub_Dept_1', 'Metrics', 'TTL EOH Ttl Qty', 'TTL Loading Cost €', 'TTL Loading Cost LC', 'TTL Trasp Cost €', 'Cost €'],
         "COMPANIES": ['RU', 'KZ'],
+        "USECOLS": ['Company', 'Day', 'Store', 'Mfg Season', 'Line Code', 'Style', 'Sub_Dept', 'Metrics', 'TTL EOH Ttl Qty', 'TTL Loading Cost €', 'TTL Loading Cost LC', 'TTL Trasp Cost €', 'Cost €'],
+        "DTYPE": {'Company': 'string', 'Store': 'string', 'Mfg Season': 'string', 'Line Code': 'string', 'Style': 'string', 'Sub_Dept': 'string', 'Metrics': 'string'},
         "SKIP": 2,
-        "IF_EXISTS": 'replace'
+        "IF_EXISTS": 'replace',
+        "LOAD_MODE": 'delete',
+        "CHUNKSIZE": 50000,
+        "SHARD_BY": None,
+        "PARTITIONED": False,
+        "RECONCILE": ['ttl_eoh_ttl_qty'],
+        "VALIDATE": {
+            "not_null": ['day', 'store', 'company', 'style'],
+            "numeric": ['ttl_eoh_ttl_qty', 'cost_€'],
+            "exclude": {"store": SUBTOTAL_PATTERN, "style": SUBTOTAL_PATTERN}
+        }
     }
 }
 
+# Validation of processed rows before the load (VALIDATE in DATA, columns in lowercase snake_case):
+# not_null - columns that must be filled, numeric - columns that must hold numbers,
+# non_negative - numeric columns that can't be below zero, known - column -> lookup it must be found in,
+# exclude - column -> pattern of values that mark a row as invalid (subtotal rows of the exports).
+# Failing rows are not loaded; they are written to QUARANTINE_PATH ('file') or to <table>_quarantine ('table')
+QUARANTINE_MODE = 'file'
+QUARANTINE_PATH = f'{BASE_PATH}\\quarantine'
+
+# Reconciliation after each load: rows and sums of the RECONCILE measures per day and company are compared
+# between the loaded frame and the table (one grouped query scoped to the loaded days); any difference fails the run.
+# Sums may differ by RECONCILE_TOLERANCE (relative) plus one cent of float rounding
+RECONCILE_TOLERANCE = 1e-9
+
+# Load modes: 'delete' removes every day present in the new data before appending,
+# 'upsert' inserts rows by their natural-key hash and updates the ones that already exist
+ROW_HASH_COL = 'row_hash'
+
+# Local cache: days already loaded per table and timings of past runs (used by the planner)
+CACHE_PATH = f'{BASE_PATH}\\cache'
+DAY_INDEX_PATH = f'{CACHE_PATH}\\day_index.json'
+RUN_PROFILE_PATH = f'{CACHE_PATH}\\run_profile.json'
+RUN_PROFILE_HISTORY = 20
+
+# Results of the read API (db_read.py): Parquet files plus a manifest, and an in-memory LRU of READ_CACHE_SIZE results
+READ_CACHE_PATH = f'{CACHE_PATH}\\queries'
+READ_CACHE_SIZE = 128
+
+# Sharded loading (opt-in, e.g. "SHARD_BY": 'company'): tables with SHARD_BY are split by that column and the shards
+# are loaded in parallel (into per-shard list partitions when PARTITIONED is set; the parent table must be partitioned
+# by SHARD_BY). 'replace' tables are never sharded, their snapshot is always swapped in one transaction
+SHARD_WORKERS = 4
+
+# Concurrent run (main.py --concurrent): number of tables read and loaded at the same time
+CONCURRENT_TABLES = 2
+
+# Column-store export of loaded rows for analysts: <EXPORT_PATH>/<table>/year=YYYY/month=MM/day=DD/part-0.parquet
+EXPORT_PATH = f'{BASE_PATH}\\export'
+EXPORT_TABLES = ["sales", "ms_sales", "ms_stock"]
+EXPORT_COMPRESSION = 'zstd'
+EXPORT_ROW_GROUP_SIZE = 100000
+
+# Archive of processed files in FOLDER_PATH_OUT: 'parquet' keeps only the parsed frame as <file>.parquet (the workbook
+# is dropped once its copy is written), 'xlsx' keeps the workbook, 'both' keeps both (opt-in, the folder grows fastest).
+# Every archived file is indexed (days, companies) in the folder's manifest.json
+ARCHIVE_MODE = 'parquet'
+ARCHIVE_COMPRESSION = 'zstd'
+
+# Backfill (main.py backfill): months of the range reloaded at the same time, each in its own transaction
+BACKFILL_WORKERS = 4
+
+# Tables a backfill can rebuild; 'replace' tables hold only the current snapshot and are never backfilled
+BACKFILL_TABLES = [name for name, info in DATA.items() if info["IF_EXISTS"] != 'replace']
+
+# Memory limit (MB) for chunked loads; the chunk size is halved while the process is above it
+MAX_MEMORY_MB = 2048
+
+# Extensions of the workbooks read from the intake and archive folders
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+# Excel parser: 'calamine' needs python-calamine, openpyxl is used when it is not installed
+EXCEL_ENGINE = 'calamine'
+
+# Module that has to be importable for each pandas Excel engine
+EXCEL_ENGINE_MODULES = {
+    "calamine": "python_calamine",
+    "openpyxl": "openpyxl",
+}
+
 # Path to the raw data files for processing
 RAW_DATA_PATH = '\\\\rumo1w6vfs001.guess.eu\\Data\\Finance\\Andreev\\MS Data'
 
@@ -56,15 +174,44 @@ LIST_OF_SHEETS = [
     "Targets"
     ]
 
+# Lookups built from the Mapping.xlsx sheets for in-pipeline enrichment:
+# SHEET - sheet or list of sheets stacked in order (a later sheet wins shared keys),
+# KEY - key columns of the sheet, COLS - columns added to the tables listed under ENRICH in DATA
+# (ENRICH maps a lookup to the table columns matched against its KEY, in the same order)
+LOOKUPS = {
+    "calendar": {"SHEET": ["Fin_Calendar_old", "Fin_Calendar_new"], "KEY": ['Date'], "COLS": ['Fin_Year', 'Fin_Period', 'Fin_Week']},
+    "stores": {"SHEET": "Stores", "KEY": ['Store'], "COLS": ['Store_Name', 'City', 'Format', 'Dist_Manager']},
+    "comp_flags": {"SHEET": "Comp_flags", "KEY": ['Store', 'Fin_Year'], "COLS": ['Comp_Flag']},
+}
+
 # List of materialized views to be refreshed in the database
 MAT_VIEWS = ["public.ms_basic_mv", "public.ms_basic_mini"]
 
+# Tables each materialized view is built from; a view is refreshed only when one of them (or the dicts) changed
+MAT_VIEW_SOURCES = {
+    "public.ms_basic_mv": ["sales", "ms_sales", "ms_stock"],
+    "public.ms_basic_mini": ["sales", "ms_sales", "ms_stock"],
+}
+
 # Константы конфигурации
 BASE_URL = "https://smrt.guess.eu/turnover/list#/byparams/"
 PREVIOUS_DAYS = 14
 MAX_WAIT_TIME = 10
 DEFAULT_RETRY_ATTEMPTS = 3
 
+# Adaptive waits: timeout = WAIT_PERCENTILE latency of the action * WAIT_SAFETY_FACTOR (doubled per retry),
+# clamped to [MIN_WAIT_TIME, MAX_WAIT_TIME]; MAX_WAIT_TIME is used until WAIT_MIN_SAMPLES latencies are known
+MIN_WAIT_TIME = 2
+WAIT_PERCENTILE = 95
+WAIT_SAFETY_FACTOR = 2.0
+WAIT_MIN_SAMPLES = 5
+WAIT_POLL_FREQUENCY = 0.2
+TELEMETRY_HISTORY = 50
+
+# Retry pause: RETRY_BACKOFF_BASE * 2 ** attempt seconds (at most RETRY_BACKOFF_MAX), with random jitter
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8
+
 # Базовая конфигурация браузера
 CHROME_PREFS = {
     "download.prompt_for_download": False,
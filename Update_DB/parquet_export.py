@@ -0,0 +1,149 @@
+import os
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from exception_config import exception
+from logging_config import logger, log_function_execution
+from params import EXPORT_COMPRESSION, EXPORT_PATH, EXPORT_ROW_GROUP_SIZE, ROW_HASH_COL
+
+PART_FILE = 'part-0.parquet'
+
+
+# Function to build the folder of a day partition
+def day_partition_path(table_name: str, day: date, EXPORT_PATH: Path = EXPORT_PATH) -> str:
+    """Returns the Hive-style folder of a day: <EXPORT_PATH>/<table>/year=YYYY/month=MM/day=DD.
+
+    Args:
+        table_name (str): Name of the table.
+        day (date): The day of the partition.
+        EXPORT_PATH (Path, optional): Root of the dataset. Defaults to EXPORT_PATH.
+
+    Returns:
+        str: Path to the partition folder.
+    """
+    return os.path.join(EXPORT_PATH, table_name, f"year={day.year}", f"month={day.month:02d}", f"day={day.day:02d}")
+
+# Function to make object columns writable by pyarrow
+def arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts object columns with mixed value types (e.g. numbers and text) to strings.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to write.
+
+    Returns:
+        pd.DataFrame: The DataFrame with homogeneous columns.
+    """
+    mixed = [
+        col for col in df.columns
+        if df[col].dtype == 'O' and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed')
+    ]
+    return df.assign(**{col: df[col].astype('string') for col in mixed}) if mixed else df
+
+# Function to export loaded rows to the Parquet dataset
+@exception
+@log_function_execution
+def export_to_parquet(df: pd.DataFrame | None, table_name: str, EXPORT_PATH: Path = EXPORT_PATH, COMPRESSION: str = EXPORT_COMPRESSION) -> int:
+    """Writes the loaded rows to a Hive-partitioned Parquet dataset, one file per table and day.
+
+    A day's file is rewritten with the day's rows, mirroring the day-wide delete of the database load.
+    For upserted tables the new rows are merged into the existing file by ROW_HASH_COL instead.
+    Files are written with column statistics and COMPRESSION, through a temporary file so readers
+    never see a partial partition.
+
+    Args:
+        df (pd.DataFrame | None): The rows that were loaded into the database.
+        table_name (str): Name of the table.
+        EXPORT_PATH (Path, optional): Root of the dataset. Defaults to EXPORT_PATH.
+        COMPRESSION (str, optional): Parquet compression codec. Defaults to EXPORT_COMPRESSION.
+
+    Returns:
+        int: Number of day partitions written.
+    """
+    if df is None or df.empty:
+        return 0
+
+    df = arrow_safe(df)
+    written = 0
+    for day, frame in df.groupby('day', sort=True):
+        folder = day_partition_path(table_name, day, EXPORT_PATH)
+        file_path = os.path.join(folder, PART_FILE)
+        os.makedirs(folder, exist_ok=True)
+
+        if ROW_HASH_COL in frame.columns and os.path.exists(file_path):
+            frame = pd.concat([pd.read_parquet(file_path), frame], ignore_index=True)
+            frame = frame.drop_duplicates(subset=ROW_HASH_COL, keep='last')
+
+        tmp_path = f"{file_path}.tmp"
+        frame.to_parquet(
+            tmp_path,
+            engine='pyarrow',
+            index=False,
+            compression=COMPRESSION,
+            row_group_size=EXPORT_ROW_GROUP_SIZE,
+            write_statistics=True,
+        )
+        os.replace(tmp_path, file_path)
+        written += 1
+
+    logger.info(f"exported {len(df)} rows of {table_name} into {written} day partitions")
+    return written
+
+# Function to list the partition files of a date range
+def partition_files(table_name: str, start: date, end: date, EXPORT_PATH: Path = EXPORT_PATH) -> list[str]:
+    """Returns the existing day files of a table between start and end (inclusive), without scanning the dataset.
+
+    Args:
+        table_name (str): Name of the table.
+        start (date): First day.
+        end (date): Last day.
+        EXPORT_PATH (Path, optional): Root of the dataset. Defaults to EXPORT_PATH.
+
+    Returns:
+        list[str]: Paths to the Parquet files.
+    """
+    files = []
+    for day in pd.date_range(start, end, freq='D'):
+        file_path = os.path.join(day_partition_path(table_name, day, EXPORT_PATH), PART_FILE)
+        if os.path.exists(file_path):
+            files.append(file_path)
+    return files
+
+# Function to read a date range from the Parquet dataset
+def read_exported(
+    table_name: str,
+    start: date,
+    end: date,
+    columns: list[str] | None = None,
+    filter: ds.Expression | None = None,
+    EXPORT_PATH: Path = EXPORT_PATH,
+) -> pd.DataFrame:
+    """Reads a table's exported rows for a date range; only the partitions of that range are opened.
+
+    Example:
+        read_exported('ms_sales', date(2024, 1, 1), date(2024, 3, 31),
+                      columns=['day', 'store', 'ttl_sls_€'], filter=ds.field('company') == 'KZ')
+
+    Args:
+        table_name (str): Name of the table.
+        start (date): First day.
+        end (date): Last day.
+        columns (list[str] | None, optional): Columns to read. Defaults to all columns.
+        filter (ds.Expression | None, optional): Row filter, pushed down to the row group statistics. Defaults to None.
+        EXPORT_PATH (Path, optional): Root of the dataset. Defaults to EXPORT_PATH.
+
+    Returns:
+        pd.DataFrame: The rows of the range.
+    """
+    files = partition_files(table_name, start, end, EXPORT_PATH)
+    if not files:
+        return pd.DataFrame(columns=columns)
+
+    # Later days may carry extra (e.g. enriched) columns, so the footers are unified into one schema
+    schema = pa.unify_schemas([pq.read_schema(file_path) for file_path in files], promote_options='permissive')
+    dataset = ds.dataset(files, schema=schema, format='parquet')
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
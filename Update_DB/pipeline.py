@@ -0,0 +1,225 @@
+import time
+
+import pandas as pd
+import sqlalchemy
+
+from db_read import query_cache
+from db_update import (
+    archive_processed_files,
+    delete_intersections,
+    get_intersections,
+    load_data_sharded,
+    load_data_to_db,
+    process_data,
+    read_excel_files,
+    refresh_materialized_views,
+    transform_and_load_dict,
+    upsert_data_to_db
+)
+from logging_config import logger, log_function_execution
+from lookups import enrich_data, ensure_columns
+from parquet_export import export_to_parquet
+from reconcile import reconcile_load
+from planner import (
+    mark_source_loaded,
+    record_throughput,
+    seed_day_index,
+    source_changed,
+    update_day_index
+)
+from params import DATA, DICT_PATH, EXPORT_TABLES, MAT_VIEWS, MAT_VIEW_SOURCES
+from validation import validate_data
+
+
+# Function to read, check and load the new files of one table
+@log_function_execution
+def process_table(
+    engine: sqlalchemy.engine.Engine,
+    session: sqlalchemy.orm.Session,
+    table_name: str,
+    table_info: dict,
+    lookups: dict[str, pd.DataFrame] | None
+) -> bool:
+    """Reads the new files of a table, validates and enriches the rows, loads them and exports them to Parquet.
+
+    The files are archived only after their rows are loaded and reconciled; a failed load leaves them
+    in the input folder for the next run.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        session (sqlalchemy.orm.Session): The session used by the day-wide deletes.
+        table_name (str): Name of the database table.
+        table_info (dict): The table settings from params.DATA.
+        lookups (dict[str, pd.DataFrame] | None): Lookup tables from build_lookups.
+
+    Returns:
+        bool: True if rows were loaded into the table.
+    """
+    logger.info(f"processing table: {table_name}")
+    seed_day_index(engine, table_name)
+
+    # Read Excel files
+    start_time = time.time()
+    batch = read_excel_files(
+                        table_info["FOLDER_PATH_IN"],
+                        table_info["FOLDER_PATH_REJECTED"],
+                        table_info["SHEET"],
+                        table_info["SKIP"],
+                        table_info["COL_NAMES"],
+                        table_info.get("USECOLS"),
+                        table_info.get("DTYPE")
+                        )
+    if batch is None:
+        return False
+    raw, files = batch
+
+    df = prepare_frame(engine, raw, table_name, table_info, lookups)
+    if df is None:
+        return False
+    record_throughput(f"{table_name}:read", time.time() - start_time, len(df))
+    loaded = not df.empty and load_frame(engine, session, df, table_name, table_info)
+    # The files leave the input folder only when their rows are loaded (a mismatch raises before this)
+    if loaded or df.empty:
+        archive_processed_files(raw, files, table_info["FOLDER_PATH_IN"], table_info["FOLDER_PATH_OUT"])
+    return loaded
+
+# Function to bring read rows to the table layout
+def prepare_frame(
+    engine: sqlalchemy.engine.Engine,
+    df: pd.DataFrame | None,
+    table_name: str,
+    table_info: dict,
+    lookups: dict[str, pd.DataFrame] | None
+) -> pd.DataFrame | None:
+    """Processes, validates and enriches the rows read from the files (or the archive) of a table.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        df (pd.DataFrame | None): Rows with the sheet columns.
+        table_name (str): Name of the database table.
+        table_info (dict): The table settings from params.DATA.
+        lookups (dict[str, pd.DataFrame] | None): Lookup tables from build_lookups.
+
+    Returns:
+        pd.DataFrame | None: The rows to load.
+    """
+    # Process data
+    df = process_data(df, table_info["COMPANIES"], table_info.get("KEY_COLS"))
+
+    # Quarantine rows failing the table rules so they never reach the load
+    df = validate_data(df, table_name, table_info.get("VALIDATE"), lookups, engine)
+
+    # Enrich with fiscal calendar, store attributes and comp flags
+    if table_info.get("ENRICH"):
+        df = enrich_data(df, lookups, table_info["ENRICH"])
+        ensure_columns(engine, table_name, df)
+    return df
+
+# Function to load prepared rows into a table
+def load_frame(
+    engine: sqlalchemy.engine.Engine,
+    session: sqlalchemy.orm.Session,
+    df: pd.DataFrame,
+    table_name: str,
+    table_info: dict
+) -> bool:
+    """Loads prepared rows with the load mode of the table, updates the day index and the read cache,
+    reconciles the rows with the table and exports them to Parquet.
+
+    The day index and the read cache are updated before the reconciliation, since the rows are
+    committed either way and cached results of the reloaded days must not be served after a mismatch.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        session (sqlalchemy.orm.Session): The session used by the day-wide deletes.
+        df (pd.DataFrame): The rows to load.
+        table_name (str): Name of the database table.
+        table_info (dict): The table settings from params.DATA.
+
+    Returns:
+        bool: True if rows were loaded into the table.
+
+    Raises:
+        ReconciliationError: If the committed rows differ from the frame.
+    """
+    start_time = time.time()
+    # A 'replace' snapshot is swapped in one transaction, so it is never split into shards
+    sharded = bool(table_info.get("SHARD_BY")) and table_info["IF_EXISTS"] != 'replace'
+
+    # Sharded load: one parallel worker per shard, deletes scoped to the shard
+    if sharded:
+        shards = load_data_sharded(
+                        df,
+                        engine,
+                        table_name,
+                        table_info["SHARD_BY"],
+                        table_info.get("LOAD_MODE", 'delete'),
+                        table_info["IF_EXISTS"],
+                        table_info.get("PARTITIONED", False),
+                        table_info.get("CHUNKSIZE", 10000)
+                        )
+        if not shards:
+            return False
+    # Idempotent load: merge rows by natural-key hash instead of deleting whole days
+    elif table_info.get("LOAD_MODE") == 'upsert':
+        upsert_data_to_db(df, engine, table_name)
+    else:
+        # A 'replace' snapshot is deleted inside the chunked replace transaction, never before it
+        if table_info["IF_EXISTS"] != 'replace':
+            # Create intersections
+            intersection_df = get_intersections(engine, df)
+
+            # Remove intersections from the database
+            delete_intersections(session, intersection_df, table_name)
+
+        # Load data to database
+        load_data_to_db(df, engine, session, table_name, table_info["IF_EXISTS"], table_info["FOLDER_PATH_IN"], table_info.get("CHUNKSIZE", 10000))
+
+    record_throughput(f"{table_name}:load", time.time() - start_time, len(df))
+    update_day_index(table_name, df['day'].unique(), replace=table_info["IF_EXISTS"] == 'replace')
+
+    # Drop cached read results built from the days that were reloaded
+    query_cache.invalidate(table_name, None if table_info["IF_EXISTS"] == 'replace' else df['day'].unique())
+
+    # Compare the committed rows with the frame; a mismatch raises and stops the run before the views
+    if table_info.get("RECONCILE") is not None:
+        reconcile_load(engine, table_name, df, table_info["RECONCILE"], BY_HASH=table_info.get("LOAD_MODE") == 'upsert')
+
+    # Export the loaded rows to the Parquet dataset for analysts
+    if table_name in EXPORT_TABLES:
+        if sharded:
+            df = df.loc[df[table_info["SHARD_BY"]].astype(str).isin(shards)]
+        export_to_parquet(df, table_name)
+    return True
+
+# Function to load the dicts and refresh the views after the tables
+@log_function_execution
+def finish_run(
+    engine: sqlalchemy.engine.Engine,
+    session: sqlalchemy.orm.Session,
+    dicts: dict[str, pd.DataFrame] | None,
+    changed_tables: set[str]
+) -> None:
+    """Loads the dicts when Mapping.xlsx changed and refreshes the materialized views built from changed data.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        session (sqlalchemy.orm.Session): The session used for the refresh.
+        dicts (dict[str, pd.DataFrame] | None): Sheets loaded by load_excel_sheets.
+        changed_tables (set[str]): Tables that got new rows in this run.
+    """
+    # Load Dicts to the database only when Mapping.xlsx changed since the last load
+    dicts_changed = bool(dicts) and source_changed("dicts", DICT_PATH)
+    if dicts_changed:
+        #transform and load dicts data to database
+        if transform_and_load_dict(engine, session, dicts):
+            mark_source_loaded("dicts", DICT_PATH)
+
+    # Refreshing the materialized views built from changed tables
+    for view in MAT_VIEWS:
+        if not dicts_changed and not changed_tables & set(MAT_VIEW_SOURCES.get(view, DATA)):
+            logger.info(f"materialized view is up to date | {view}")
+            continue
+        start_time = time.time()
+        refresh_materialized_views(session, view)
+        record_throughput(f"refresh:{view}", time.time() - start_time)
@@ -0,0 +1,280 @@
+import os
+import time
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+from db_update import parse_days, resolve_excel_engine
+from exception_config import exception
+from json_cache import CACHE_LOCK, read_json, write_json
+from logging_config import log_function_execution
+from params import (
+    DATA,
+    DAY_INDEX_PATH,
+    MAT_VIEWS,
+    RAW_DATA_PATH,
+    RUN_PROFILE_HISTORY,
+    RUN_PROFILE_PATH,
+    TARGET_KEYS
+)
+
+
+# Function to update the cached day index of a table
+@exception
+def update_day_index(table_name: str, days, replace: bool = False) -> None:
+    """Adds loaded days to the cached per-table day index.
+
+    Args:
+        table_name (str): Name of the database table.
+        days: Iterable of loaded days (dates or ISO strings).
+        replace (bool, optional): Whether the table was fully replaced. Defaults to False.
+    """
+    with CACHE_LOCK:
+        index = read_json(DAY_INDEX_PATH, {})
+        known = set() if replace else set(index.get(table_name, []))
+        index[table_name] = sorted(known | {str(day) for day in days})
+        write_json(DAY_INDEX_PATH, index)
+
+# Function to seed the day index of a table from the database
+@exception
+@log_function_execution
+def seed_day_index(engine: sqlalchemy.engine.Engine, table_name: str) -> None:
+    """Fills the cached day index of a table from the database if the table is not indexed yet.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        table_name (str): Name of the database table.
+    """
+    if table_name in read_json(DAY_INDEX_PATH, {}):
+        return
+
+    days = pd.read_sql(text(f'select DISTINCT day as key from {table_name}'), engine)['key']
+    update_day_index(table_name, days)
+
+# Function to record timings of a run stage
+@exception
+def record_throughput(stage: str, seconds: float, rows: int = 0) -> None:
+    """Appends the timing of a stage (e.g. 'ms_sales:load', 'refresh:public.ms_basic_mv') to the run profile.
+
+    Args:
+        stage (str): Name of the stage.
+        seconds (float): Duration of the stage.
+        rows (int, optional): Number of rows the stage handled. Defaults to 0.
+    """
+    with CACHE_LOCK:
+        profile = read_json(RUN_PROFILE_PATH, {})
+        history = profile.setdefault("throughput", {}).setdefault(stage, [])
+        history.append({"rows": int(rows), "seconds": round(seconds, 3), "at": time.strftime('%Y-%m-%d %H:%M:%S')})
+        del history[:-RUN_PROFILE_HISTORY]
+        write_json(RUN_PROFILE_PATH, profile)
+
+# Function to check whether a source file changed since it was last loaded
+def source_changed(key: str, path: Path) -> bool:
+    """Compares the modification time of a source file with the one recorded in the run profile.
+
+    Args:
+        key (str): Name of the source, e.g. 'dicts'.
+        path (Path): Path to the file.
+
+    Returns:
+        bool: True if the file changed or was never loaded.
+    """
+    if not os.path.exists(path):
+        return False
+    loaded = read_json(RUN_PROFILE_PATH, {}).get("sources", {}).get(key)
+    return loaded != os.path.getmtime(path)
+
+# Function to record that a source file was loaded
+@exception
+def mark_source_loaded(key: str, path: Path) -> None:
+    """Records the modification time of a loaded source file in the run profile.
+
+    Args:
+        key (str): Name of the source, e.g. 'dicts'.
+        path (Path): Path to the file.
+    """
+    with CACHE_LOCK:
+        profile = read_json(RUN_PROFILE_PATH, {})
+        profile.setdefault("sources", {})[key] = os.path.getmtime(path)
+        write_json(RUN_PROFILE_PATH, profile)
+
+# Function to project the duration of a stage from past runs
+def project_seconds(profile: dict, stage: str, rows: int | None = None) -> float | None:
+    """Projects the duration of a stage from its recorded throughput.
+
+    Args:
+        profile (dict): The run profile.
+        stage (str): Name of the stage.
+        rows (int | None, optional): Rows to process; None projects the average duration. Defaults to None.
+
+    Returns:
+        float | None: Projected seconds, or None if there is no history.
+    """
+    history = profile.get("throughput", {}).get(stage, [])
+    seconds = sum(item["seconds"] for item in history)
+    if not history or seconds <= 0:
+        return None
+    if rows is None:
+        return seconds / len(history)
+    handled = sum(item["rows"] for item in history)
+    return rows * seconds / handled if handled else None
+
+# Function to scan a workbook without loading its cells
+def scan_file(file_path: str, table_info: dict) -> tuple[int, set]:
+    """Returns the row count of a sheet from its dimension record and the days of its 'Day' column.
+
+    The dimension record is read with openpyxl in read-only mode, which loads no cells. The 'Day'
+    column alone is parsed with the run's Excel engine (calamine), since streaming it through
+    openpyxl still parses the XML of every row.
+
+    Args:
+        file_path (str): Path to the Excel file.
+        table_info (dict): The table settings from params.DATA.
+
+    Returns:
+        tuple[int, set]: Data rows of the sheet (without the skipped rows and the header) and its days.
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        max_row = wb[table_info["SHEET"]].max_row or 0
+    finally:
+        wb.close()
+
+    days = pd.read_excel(
+        file_path,
+        sheet_name=table_info["SHEET"],
+        skiprows=table_info["SKIP"],
+        usecols=[table_info["COL_NAMES"].index('Day')],
+        names=['Day'],
+        engine=resolve_excel_engine(),
+    )['Day'].dropna()
+    return max(max_row - table_info["SKIP"] - 1, 0), set(parse_days(days).dropna())
+
+# Function to list the files a run would load into a table
+def pending_files(table_info: dict, RAW_DATA_PATH: str = RAW_DATA_PATH, TARGET_KEYS: dict[str, str] = TARGET_KEYS) -> list[str]:
+    """Lists the files of the intake folder of a table and the files waiting in RAW_DATA_PATH that the
+    distribution would move there (first matching TARGET_KEYS prefix, like distrib_files_to_target_dirs).
+
+    Args:
+        table_info (dict): The table settings from params.DATA.
+        RAW_DATA_PATH (str, optional): The share with the raw files. Defaults to RAW_DATA_PATH.
+        TARGET_KEYS (dict[str, str], optional): File name prefix -> intake folder. Defaults to TARGET_KEYS.
+
+    Returns:
+        list[str]: Paths of the files; a waiting file replaces an intake file of the same name.
+    """
+    folder = table_info["FOLDER_PATH_IN"]
+    files = {file: os.path.join(folder, file) for file in os.listdir(folder)} if os.path.exists(folder) else {}
+
+    if folder in TARGET_KEYS.values() and os.path.exists(RAW_DATA_PATH):
+        for file in os.listdir(RAW_DATA_PATH):
+            file_path = os.path.join(RAW_DATA_PATH, file)
+            prefix = next((prefix for prefix in TARGET_KEYS if file.startswith(prefix)), None)
+            if os.path.isfile(file_path) and prefix is not None and TARGET_KEYS[prefix] == folder:
+                files[file] = file_path
+    return list(files.values())
+
+# Function to plan the load of a table
+@exception
+def plan_table(table_name: str, table_info: dict, day_index: dict, profile: dict) -> dict | None:
+    """Estimates the work of loading a table without touching the files or the database.
+
+    Args:
+        table_name (str): Name of the database table.
+        table_info (dict): The table settings from params.DATA.
+        day_index (dict): Cached days per table.
+        profile (dict): The run profile with past throughput.
+
+    Returns:
+        dict | None: Files, estimated rows, days, days to delete and projected seconds.
+    """
+    files = pending_files(table_info)
+
+    rows, days = 0, set()
+    for file_path in files:
+        file_rows, file_days = scan_file(file_path, table_info)
+        rows += file_rows
+        days |= file_days
+
+    indexed = table_name in day_index
+    known = {pd.Timestamp(day).date() for day in day_index.get(table_name, [])}
+    if not files:
+        to_delete = set()
+    elif table_info["IF_EXISTS"] == 'replace':
+        to_delete = known
+    else:
+        to_delete = days & known
+
+    read_seconds = project_seconds(profile, f"{table_name}:read", rows)
+    load_seconds = project_seconds(profile, f"{table_name}:load", rows)
+    return {
+        "table": table_name,
+        "files": len(files),
+        "rows": rows,
+        "days": sorted(days),
+        "indexed": indexed,
+        "to_delete": sorted(to_delete),
+        "mode": 'replace' if table_info["IF_EXISTS"] == 'replace' else table_info.get("LOAD_MODE", 'delete'),
+        "seconds": None if read_seconds is None or load_seconds is None else read_seconds + load_seconds,
+    }
+
+# Function to format a day set
+def format_days(days: list) -> str:
+    """Formats a sorted list of days as a short range description."""
+    if not days:
+        return '-'
+    if len(days) <= 3:
+        return ', '.join(str(day) for day in days)
+    return f"{len(days)} days {days[0]} .. {days[-1]}"
+
+# Function to print the plan of a run
+@log_function_execution
+def print_plan() -> None:
+    """Prints what a run would do: files, estimated rows, days to delete and projected load/refresh time.
+
+    Files still waiting in RAW_DATA_PATH are planned with the table they would be distributed to.
+    Nothing is moved, written or loaded; only sheet metadata and the 'Day' columns are read.
+    """
+    day_index = read_json(DAY_INDEX_PATH, {})
+    profile = read_json(RUN_PROFILE_PATH, {})
+
+    total, unknown = 0.0, False
+    for table_name, table_info in DATA.items():
+        plan = plan_table(table_name, table_info, day_index, profile)
+        if plan is None:
+            continue
+        if not plan["files"]:
+            print(f"{table_name: <9} | no files")
+            continue
+
+        if not plan["indexed"]:
+            deletes = 'unknown (no cached day index)'
+        elif plan["mode"] == 'upsert':
+            deletes = f"none, upsert over {format_days(plan['to_delete'])}"
+        else:
+            deletes = format_days(plan["to_delete"])
+
+        if plan["seconds"] is None:
+            unknown = True
+            eta = 'no history'
+        else:
+            total += plan["seconds"]
+            eta = f"{plan['seconds']:.0f}s"
+        print(
+            f"{table_name: <9} | {plan['files']} files | ~{plan['rows']} rows | "
+            f"days {format_days(plan['days'])} | delete {deletes} | load {eta}"
+        )
+
+    for view in MAT_VIEWS:
+        seconds = project_seconds(profile, f"refresh:{view}")
+        if seconds is None:
+            unknown = True
+            print(f"refresh {view} | no history")
+        else:
+            total += seconds
+            print(f"refresh {view} | {seconds:.0f}s")
+
+    print(f"projected total: {total:.0f}s{' (incomplete history)' if unknown else ''}")
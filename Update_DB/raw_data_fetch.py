@@ -1,6 +1,8 @@
-from typing import List, Tuple, Dict, Optional, Callable
+from typing import List, Tuple, Dict, Optional
 from datetime import datetime, timedelta
+import calendar
 import os
+import time
 from functools import partial
 
 from selenium import webdriver
@@ -8,10 +10,6 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import (
-    TimeoutException,
-    StaleElementReferenceException
-)
 
 # Import configuration from external files
 from logging_config import logger
@@ -19,8 +17,10 @@ from params import (
     CHROME_PREFS,
     DEFAULT_RETRY_ATTEMPTS,
     MAX_WAIT_TIME,
-    PREVIOUS_DAYS
+    PREVIOUS_DAYS,
+    WAIT_POLL_FREQUENCY
 )
+from wait_strategy import retry_action, telemetry
 
 
 # Function to create an action
@@ -133,26 +133,54 @@ def calculate_calendar_position(date: datetime) -> Tuple[int, int]:
     weekday = (date.weekday() + 1) % 7 + 1
     return week, weekday
 
-# Function to generate a date selector
-def get_date_selector(date: datetime, index: int = 0) -> str:
+# Script that picks a date in the open datepicker, whichever of the page's datepicker nodes it is.
+# Cells are matched by their data-date attribute (UTC midnight in ms), paging months with prev/next.
+# Returns 'picked', null while no picker is visible yet (the wait keeps polling), or a final status:
+# 'disabled' for a disabled target cell, 'unreachable' if paging does not reach it (e.g. at the range limit).
+# Only pickers without data-date fall back to the week/weekday grid position inside the visible picker.
+PICK_DATE_SCRIPT = """
+const [target, week, weekday] = arguments;
+const picker = Array.from(document.querySelectorAll('div.datepicker.dropdown-menu'))
+    .find(el => getComputedStyle(el).display !== 'none');
+if (!picker) return null;
+const days = picker.querySelector('div.datepicker-days');
+if (days.querySelector('td.day[data-date]')) {
+    for (let step = 0; step < 24; step++) {
+        const cell = days.querySelector(`td.day[data-date="${target}"]`);
+        if (cell) {
+            if (cell.classList.contains('disabled')) return 'disabled';
+            cell.click();
+            return 'picked';
+        }
+        const first = Number(days.querySelector('td.day[data-date]').dataset.date);
+        days.querySelector(target < first ? 'th.prev' : 'th.next').click();
+    }
+    return 'unreachable';
+}
+const cell = days.querySelector(`tbody > tr:nth-child(${week}) > td:nth-child(${weekday})`);
+if (!cell) return null;
+cell.click();
+return 'picked';
+"""
+
+
+class DatePickError(Exception):
+    """Raised when the datepicker is open but the date can't be selected in it; retrying does not help."""
+
+
+# Function to build the arguments of the date picking script
+def get_date_script_args(date: datetime) -> Tuple[int, int, int]:
     """
-    Generates a CSS selector for selecting a specific date in a calendar.
+    Returns the arguments of PICK_DATE_SCRIPT for a date.
 
     Args:
         date (datetime): The date to select.
-        index (int): Index of the calendar (0 for the first calendar).
 
     Returns:
-        str: The generated CSS selector.
+        Tuple[int, int, int]: The data-date value of the day cell and its week/weekday grid position.
     """
     week, weekday = calculate_calendar_position(date)
-    base_selector = f"tr:nth-child({week}) > td:nth-child({weekday})"
-    
-    if index == 0:
-        return f"body > div.datepicker.dropdown-menu > div.datepicker-days > table > tbody > {base_selector}"
-    
-    calendar_index = 70 + (index - 1) * 2
-    return f"body > div:nth-child({calendar_index}) > div.datepicker-days > table > tbody > {base_selector}"
+    return calendar.timegm(date.date().timetuple()) * 1000, week, weekday
 
 # Function to create authorization actions
 def get_authorization_actions(login: str, password: str) -> List[Dict]:
@@ -174,26 +202,36 @@ def get_authorization_actions(login: str, password: str) -> List[Dict]:
         create_action('click', (By.ID, "idSIButton9"))
     ]
 
-def get_processing_actions(date_selector: str) -> List[Dict]:
+def get_processing_actions(date: datetime) -> List[Dict]:
     """Создает список действий для обработки даты."""
     return [
         create_action('click', (By.CSS_SELECTOR, "button.btn-block")),
-        create_action('click', (By.CSS_SELECTOR, date_selector)),
+        create_action('pick_date', None, date.strftime('%Y-%m-%d')),
         create_action('click', (By.CSS_SELECTOR, "button.red")),
         create_action('click', (By.CSS_SELECTOR, "div.col-md-6:nth-child(2) > div:nth-child(1) > ul:nth-child(1) > li:nth-child(2) > ul:nth-child(1) > li:nth-child(1) > button:nth-child(1) > i:nth-child(1)"))
     ]
 
-# Function to create actions for processing a specific date
-def execute_action(wait: WebDriverWait, action: Dict) -> None:
+# Function to execute a single action
+def execute_action(driver: webdriver.Chrome, action: Dict, timeout: float = MAX_WAIT_TIME) -> None:
     """
-    Creates a list of actions to process a specific date.
+    Waits until the action's element is clickable and performs the action on it.
+    'pick_date' actions select the date given in the action's text in the open datepicker;
+    a date the picker can't show or select raises DatePickError, which is not retried.
 
     Args:
-        date_selector (str): The CSS selector for the date to process.
-
-    Returns:
-        List[Dict]: A list of actions for processing the date.
+        driver (webdriver.Chrome): The Selenium WebDriver instance.
+        action (Dict): The action to perform.
+        timeout (float): Seconds to wait for the element.
     """
+    wait = WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_FREQUENCY)
+    
+    if action["action_type"] == 'pick_date':
+        args = get_date_script_args(datetime.strptime(action["text"], '%Y-%m-%d'))
+        status = wait.until(lambda d: d.execute_script(PICK_DATE_SCRIPT, *args))
+        if status != 'picked':
+            raise DatePickError(f"date {action['text']} can't be picked: {status}")
+        return
+    
     element = wait.until(EC.element_to_be_clickable(action["locator"]))
     
     if action["action_type"] == 'click':
@@ -202,40 +240,24 @@ def execute_action(wait: WebDriverWait, action: Dict) -> None:
         element.clear()
         element.send_keys(action["text"])
 
-# Function to retry an action with multiple attempts
-def retry_action(action_func: Callable, max_attempts: int = DEFAULT_RETRY_ATTEMPTS) -> None:
-    """
-    Retries the execution of an action multiple times in case of specific exceptions.
-
-    Args:
-        action_func (Callable): The action function to execute.
-        max_attempts (int): The maximum number of retry attempts.
-
-    Raises:
-        Exception: Re-raises the last encountered exception if all retries fail.
-    """
-    for attempt in range(max_attempts):
-        try:
-            action_func()
-            return
-        except (TimeoutException, StaleElementReferenceException):
-            if attempt == max_attempts - 1:
-                raise
-
 # Function to execute a list of actions sequentially
-def execute_actions(wait: WebDriverWait, actions: List[Dict]) -> None:
+def execute_actions(driver: webdriver.Chrome, actions: List[Dict]) -> None:
     """
-    Executes a list of Selenium actions sequentially, retrying each action on failure.
+    Executes a list of Selenium actions sequentially, retrying each action on transient failures.
 
     Args:
-        wait (WebDriverWait): The WebDriverWait instance to manage timeouts.
+        driver (webdriver.Chrome): The Selenium WebDriver instance.
         actions (List[Dict]): A list of actions to execute in sequence.
 
     Raises:
         Exception: Propagates exceptions from individual actions if retries fail.
     """
     for action in actions:
-        retry_action(lambda: execute_action(wait, action))
+        retry_action(
+            partial(execute_action, driver, action),
+            DEFAULT_RETRY_ATTEMPTS,
+            telemetry.key(action)
+        )
 
 # Function to check if the expected file is downloaded
 def check_file_downloaded(download_path: str, expected_path: str) -> bool:
@@ -278,35 +300,32 @@ def wait_for_file(download_path: str, expected_path: str) -> None:
         TimeoutException: If the file is not downloaded within the maximum wait time.
     """
     checker = partial(check_file_downloaded, download_path, expected_path)
-    WebDriverWait(None, MAX_WAIT_TIME).until(lambda _: checker())
+    start_time = time.perf_counter()
+    WebDriverWait(None, MAX_WAIT_TIME, poll_frequency=WAIT_POLL_FREQUENCY).until(lambda _: checker())
+    telemetry.record("download:TurnoverList", time.perf_counter() - start_time)
 
 # Function to process a single date
 def process_date(
     driver: webdriver.Chrome,
-    wait: WebDriverWait,
     download_path: str,
-    date: datetime,
-    index: int
+    date: datetime
 ) -> None:
     """
     Processes a single date by performing necessary actions and downloading a file.
 
     Args:
         driver (webdriver.Chrome): The Selenium WebDriver instance.
-        wait (WebDriverWait): The WebDriverWait instance to handle timeouts.
         download_path (str): The directory where downloads are stored.
         date (datetime): The date to process.
-        index (int): The index of the calendar to interact with.
 
     Raises:
         Exception: If actions fail or the file is not downloaded successfully.
     """
-    date_selector = get_date_selector(date, index)
     formatted_date = date.strftime("%d.%m.%y")
     file_path = os.path.join(download_path, f"TurnoverList ({formatted_date}).xlsx")
     
-    actions = get_processing_actions(date_selector)
-    execute_actions(wait, actions)
+    actions = get_processing_actions(date)
+    execute_actions(driver, actions)
     wait_for_file(download_path, file_path)
 
 
@@ -0,0 +1,154 @@
+import io
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+from json_cache import CACHE_LOCK, read_json, write_json
+from logging_config import logger
+from params import RECONCILE_TOLERANCE, ROW_HASH_COL, RUN_PROFILE_PATH
+
+GROUP_COLS = ['day', 'company']
+
+
+class ReconciliationError(Exception):
+    """Raised when the rows committed to a table differ from the rows that were loaded."""
+
+
+# Function to aggregate the loaded frame
+def frame_totals(df: pd.DataFrame, MEASURES: list[str]) -> pd.DataFrame:
+    """Returns rows and measure sums of the frame per day and company.
+
+    Args:
+        df (pd.DataFrame): The loaded rows.
+        MEASURES (list[str]): Measure columns to sum.
+
+    Returns:
+        pd.DataFrame: Columns day, company, rows and one sum per measure, keys as strings.
+    """
+    frame = df[GROUP_COLS].astype(str).assign(
+        rows=1,
+        **{col: pd.to_numeric(df[col], errors='coerce') for col in MEASURES}
+    )
+    return frame.groupby(GROUP_COLS, as_index=False).sum(min_count=1)
+
+# Function to stage the row hashes of a frame
+def stage_hashes(connection: sqlalchemy.engine.Connection, df: pd.DataFrame) -> None:
+    """Copies the row hashes of the frame into the temp table reconcile_hashes, dropped at commit.
+
+    COPY streams the hashes as plain text; bound as an array they would be inlined by psycopg2
+    as one literal per row in the SQL text of the query.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): A connection inside a transaction.
+        df (pd.DataFrame): The loaded rows.
+    """
+    connection.execute(text(f'CREATE TEMP TABLE reconcile_hashes ({ROW_HASH_COL} bigint PRIMARY KEY) ON COMMIT DROP'))
+    buffer = io.StringIO()
+    df[ROW_HASH_COL].drop_duplicates().to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY reconcile_hashes ({ROW_HASH_COL}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+# Function to aggregate the committed rows
+def table_totals(engine: sqlalchemy.engine.Engine, name: str, df: pd.DataFrame, MEASURES: list[str], BY_HASH: bool = False) -> pd.DataFrame:
+    """Returns rows and measure sums of the table per day and company with one grouped query.
+
+    The query only touches the loaded days. With BY_HASH (upserted tables, whose days may also hold
+    rows from earlier loads) it is further limited to the row hashes of the frame, joined from a temp table.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table.
+        df (pd.DataFrame): The loaded rows.
+        MEASURES (list[str]): Measure columns to sum.
+        BY_HASH (bool, optional): Whether to count only the rows with the hashes of the frame. Defaults to False.
+
+    Returns:
+        pd.DataFrame: Columns day, company, rows and one sum per measure, keys as strings.
+    """
+    sums = ''.join(f', sum(t."{col}") AS "{col}"' for col in MEASURES)
+    query = f'SELECT t.day, t.company, count(*) AS rows{sums} FROM {name} t'
+    if BY_HASH:
+        query += f' JOIN reconcile_hashes h ON t.{ROW_HASH_COL} = h.{ROW_HASH_COL}'
+    query += ' WHERE t.day = ANY(:days) GROUP BY t.day, t.company'
+
+    with engine.begin() as connection:
+        if BY_HASH:
+            stage_hashes(connection, df)
+        totals = pd.read_sql(text(query), connection, params={"days": list(df['day'].unique())})
+    return totals.astype({col: str for col in GROUP_COLS})
+
+# Function to reconcile a load
+def reconcile_load(
+    engine: sqlalchemy.engine.Engine,
+    name: str,
+    df: pd.DataFrame,
+    MEASURES: list[str] | None,
+    BY_HASH: bool = False,
+    TOLERANCE: float = RECONCILE_TOLERANCE
+) -> dict:
+    """Compares rows and measure sums per day and company between the loaded frame and the table.
+
+    A shard or chunk whose failure was swallowed by @exception shows up as missing rows here.
+    The summary is logged, kept in the run profile, and a mismatch raises ReconciliationError.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The database engine object.
+        name (str): Name of the table.
+        df (pd.DataFrame): The rows that were loaded.
+        MEASURES (list[str] | None): Measure columns to compare, e.g. ['amount'].
+        BY_HASH (bool, optional): Whether to compare only the rows with the hashes of the frame (upserted tables). Defaults to False.
+        TOLERANCE (float, optional): Relative tolerance of the sums. Defaults to RECONCILE_TOLERANCE.
+
+    Returns:
+        dict: Days, companies, row and measure totals of the frame and the table, and the mismatched groups.
+
+    Raises:
+        ReconciliationError: If any day and company differs.
+    """
+    start_time = time.time()
+    MEASURES = [col for col in MEASURES or [] if col in df.columns]
+    expected = frame_totals(df, MEASURES)
+    committed = table_totals(engine, name, df, MEASURES, BY_HASH and ROW_HASH_COL in df.columns)
+    merged = expected.merge(committed, on=GROUP_COLS, how='outer', suffixes=('', '_db')).fillna(0)
+
+    mismatch = merged['rows'] != merged['rows_db']
+    for col in MEASURES:
+        mismatch |= ~np.isclose(merged[col].astype(float), merged[f"{col}_db"].astype(float), rtol=TOLERANCE, atol=0.01)
+
+    summary = {
+        "days": int(merged['day'].nunique()),
+        "companies": sorted(merged['company'].unique()),
+        **{
+            col: [float(merged[col].sum()), float(merged[f"{col}_db"].sum())]
+            for col in ['rows'] + MEASURES
+        },
+        "mismatches": merged.loc[mismatch, GROUP_COLS + ['rows', 'rows_db']].head(20).to_dict('records'),
+        "seconds": round(time.time() - start_time, 3),
+        "at": time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    try:
+        with CACHE_LOCK:
+            profile = read_json(RUN_PROFILE_PATH, {})
+            profile.setdefault("reconcile", {})[name] = summary
+            write_json(RUN_PROFILE_PATH, profile)
+    except OSError as e:
+        logger.warning(f"can't save reconciliation of {name}: {e}")
+
+    totals = ' | '.join(
+        f"{col} {summary[col][0]:,.{0 if col == 'rows' else 2}f} / {summary[col][1]:,.{0 if col == 'rows' else 2}f}"
+        for col in ['rows'] + MEASURES
+    )
+    if not mismatch.any():
+        logger.info(f"reconcile {name}: {summary['days']} days x {len(summary['companies'])} companies | {totals} | OK")
+        return summary
+
+    groups = ', '.join(f"{item['day']} {item['company']}" for item in summary["mismatches"][:5])
+    logger.error(f"reconcile {name}: {int(mismatch.sum())} day/company groups differ ({groups}) | {totals}")
+    raise ReconciliationError(f"{name}: loaded rows differ from the table for {int(mismatch.sum())} day/company groups")
@@ -0,0 +1,159 @@
+import os
+import time
+import uuid
+
+import pandas as pd
+import sqlalchemy
+
+from exception_config import exception
+from json_cache import CACHE_LOCK, read_json, write_json
+from logging_config import logger, log_function_execution
+from lookups import normalize_key
+from params import QUARANTINE_MODE, QUARANTINE_PATH, RUN_PROFILE_PATH
+from parquet_export import arrow_safe
+
+VIOLATIONS_COL = 'violations'
+
+
+# Function to evaluate the validation rules of a table
+def rule_masks(df: pd.DataFrame, VALIDATE: dict, lookups: dict[str, pd.DataFrame] | None = None) -> dict[str, pd.Series]:
+    """Evaluates declarative rules over the whole frame, one boolean mask of failing rows per rule.
+
+    Rules on columns the frame does not have are skipped with a warning, so a changed export
+    layout shows up in the log instead of failing the load.
+
+    Args:
+        df (pd.DataFrame): The processed DataFrame.
+        VALIDATE (dict): The rules of the table (see VALIDATE in params.DATA).
+        lookups (dict[str, pd.DataFrame] | None, optional): Lookup tables for the 'known' rules. Defaults to None.
+
+    Returns:
+        dict[str, pd.Series]: Rule name (e.g. 'non_negative:pcs') -> mask of the rows violating it.
+    """
+    masks = {}
+    rules = [(kind, col, None) for kind in ("not_null", "numeric", "non_negative") for col in VALIDATE.get(kind, [])]
+    rules += [(kind, col, arg) for kind in ("known", "exclude") for col, arg in VALIDATE.get(kind, {}).items()]
+
+    for kind, col, arg in rules:
+        name = f"{kind}:{col}"
+        if col not in df.columns:
+            logger.warning(f"validation rule {name} skipped: no column '{col}'")
+            continue
+        values = df[col]
+
+        if kind == "not_null":
+            masks[name] = values.isna()
+        elif kind == "numeric":
+            masks[name] = values.notna() & pd.to_numeric(values, errors='coerce').isna()
+        elif kind == "non_negative":
+            masks[name] = pd.to_numeric(values, errors='coerce') < 0
+        elif kind == "known":
+            table = (lookups or {}).get(arg)
+            if table is None:
+                logger.warning(f"validation rule {name} skipped: lookup '{arg}' is not loaded")
+                continue
+            masks[name] = values.notna() & ~normalize_key(values).isin(table.index.get_level_values(0))
+        elif kind == "exclude":
+            masks[name] = values.astype('string').str.contains(arg, regex=True, na=False)
+
+        masks[name] = masks[name].fillna(False).astype(bool)
+    return masks
+
+# Function to set aside failing rows
+def quarantine_rows(bad: pd.DataFrame, table_name: str, engine: sqlalchemy.engine.Engine | None = None, MODE: str = QUARANTINE_MODE) -> str:
+    """Writes rejected rows, with the rules they violate, to a file or to the <table>_quarantine table.
+
+    Args:
+        bad (pd.DataFrame): The rejected rows with the VIOLATIONS_COL column.
+        table_name (str): Name of the target table.
+        engine (sqlalchemy.engine.Engine | None, optional): The database engine object, needed for MODE 'table'. Defaults to None.
+        MODE (str, optional): 'file' or 'table'. Defaults to QUARANTINE_MODE.
+
+    Returns:
+        str: Where the rows were written.
+    """
+    bad = bad.assign(quarantined_at=pd.Timestamp.now().floor('s'))
+    if MODE == 'table' and engine is not None:
+        target = f"{table_name}_quarantine"
+        bad.astype({col: 'string' for col in bad.columns if bad[col].dtype == 'O'}).to_sql(
+            target, engine, if_exists='append', index=False, chunksize=10000
+        )
+        return target
+
+    os.makedirs(QUARANTINE_PATH, exist_ok=True)
+    # Months of a backfill are validated in parallel, so the timestamp alone is not unique
+    target = os.path.join(QUARANTINE_PATH, f"{table_name}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.parquet")
+    arrow_safe(bad).to_parquet(target, engine='pyarrow', index=False)
+    return target
+
+# Function to record the violations of a run
+@exception
+def record_violations(table_name: str, rows: int, counts: dict[str, int]) -> None:
+    """Stores the violation counts of the latest run of a table in the run profile.
+
+    Args:
+        table_name (str): Name of the table.
+        rows (int): Rows checked.
+        counts (dict[str, int]): Rule name -> rows violating it.
+    """
+    with CACHE_LOCK:
+        profile = read_json(RUN_PROFILE_PATH, {})
+        profile.setdefault("validation", {})[table_name] = {
+            "rows": int(rows),
+            "rejected": counts,
+            "at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        write_json(RUN_PROFILE_PATH, profile)
+
+# Function to validate processed data
+@exception
+@log_function_execution
+def validate_data(
+    df: pd.DataFrame | None,
+    table_name: str,
+    VALIDATE: dict | None,
+    lookups: dict[str, pd.DataFrame] | None = None,
+    engine: sqlalchemy.engine.Engine | None = None
+) -> pd.DataFrame | None:
+    """Checks processed rows against the table rules and returns only the valid ones.
+
+    Failing rows (empty days, negative pieces, unknown stores, subtotal rows, ...) are quarantined
+    with the list of rules they violate, so they never reach the load and can't fail a batch.
+    If the quarantine can't be written (e.g. a locked file), the failing rows are only logged
+    and the valid rows are still returned.
+
+    Args:
+        df (pd.DataFrame | None): The processed DataFrame.
+        table_name (str): Name of the table.
+        VALIDATE (dict | None): The rules of the table; None skips validation.
+        lookups (dict[str, pd.DataFrame] | None, optional): Lookup tables for the 'known' rules. Defaults to None.
+        engine (sqlalchemy.engine.Engine | None, optional): The database engine object for table quarantine. Defaults to None.
+
+    Returns:
+        pd.DataFrame | None: The valid rows.
+    """
+    if df is None or df.empty or not VALIDATE:
+        return df
+
+    masks = rule_masks(df, VALIDATE, lookups)
+    failing = {name: mask for name, mask in masks.items() if mask.any()}
+    counts = {name: int(mask.sum()) for name, mask in failing.items()}
+    record_violations(table_name, len(df), counts)
+    if not failing:
+        logger.info(f"validation {table_name}: {len(df)} rows passed")
+        return df
+
+    rejected = pd.concat(failing, axis=1).any(axis=1)
+    labels = pd.Series('', index=df.index, dtype='string')
+    for name, mask in failing.items():
+        labels = labels.mask(mask, labels + name + ';')
+
+    try:
+        target = quarantine_rows(df.loc[rejected].assign(**{VIOLATIONS_COL: labels[rejected].str.rstrip(';')}), table_name, engine)
+    except Exception as e:
+        # The files are already archived, so the valid rows are loaded even if the rejected ones can't be kept
+        logger.error(f"can't quarantine the rejected rows of {table_name}: {e}")
+        target = 'nowhere, quarantine failed'
+    summary = ', '.join(f"{name} {count}" for name, count in counts.items())
+    logger.warning(f"validation {table_name}: {int(rejected.sum())} of {len(df)} rows rejected ({target}) | {summary}")
+    return df.loc[~rejected]
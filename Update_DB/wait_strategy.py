@@ -0,0 +1,170 @@
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from selenium.common.exceptions import (
+    ElementClickInterceptedException,
+    ElementNotInteractableException,
+    StaleElementReferenceException,
+    TimeoutException
+)
+
+from json_cache import CACHE_LOCK, read_json, write_json
+from logging_config import logger
+from params import (
+    DEFAULT_RETRY_ATTEMPTS,
+    MAX_WAIT_TIME,
+    MIN_WAIT_TIME,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    RUN_PROFILE_PATH,
+    TELEMETRY_HISTORY,
+    WAIT_MIN_SAMPLES,
+    WAIT_PERCENTILE,
+    WAIT_SAFETY_FACTOR
+)
+
+# Errors worth another attempt; anything else (invalid selector, closed window, lost session) fails at once
+TRANSIENT_ERRORS = (
+    TimeoutException,
+    StaleElementReferenceException,
+    ElementClickInterceptedException,
+    ElementNotInteractableException
+)
+
+
+# Function to take a percentile of samples
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Returns the q-th percentile (nearest rank) of a list of samples.
+
+    Args:
+        samples (List[float]): The samples.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile value.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+# Function to compute a jittered exponential backoff
+def backoff_delay(attempt: int) -> float:
+    """
+    Returns the pause before the next attempt: exponential in the attempt number, capped, with random jitter.
+
+    Args:
+        attempt (int): Zero-based number of the failed attempt.
+
+    Returns:
+        float: Seconds to sleep.
+    """
+    delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+class ActionTelemetry:
+    """
+    Latencies of scraper actions keyed by action type and locator.
+
+    Timeouts are derived from the observed latency percentile, so a fast portal is not waited on
+    for MAX_WAIT_TIME and a slow one gets the time it usually needs. Samples are kept in the run
+    profile between runs.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.failures: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def key(action: Dict) -> str:
+        """Returns the telemetry key of an action, e.g. 'click:css selector=button.red'."""
+        strategy, value = action["locator"] or ('', '')
+        return f"{action['action_type']}:{strategy}={value}"
+
+    def record(self, key: str, seconds: float, ok: bool = True) -> None:
+        """Stores the latency of a successful attempt or counts a failed one."""
+        if ok:
+            self.samples[key].append(round(seconds, 3))
+            del self.samples[key][:-TELEMETRY_HISTORY]
+        else:
+            self.failures[key] += 1
+
+    def timeout_for(self, key: str, attempt: int = 0) -> float:
+        """
+        Returns the wait timeout for an action: the latency percentile times a safety factor,
+        doubled on every retry and clamped to [MIN_WAIT_TIME, MAX_WAIT_TIME].
+        """
+        samples = self.samples.get(key, [])
+        if len(samples) < WAIT_MIN_SAMPLES:
+            return MAX_WAIT_TIME
+        timeout = percentile(samples, WAIT_PERCENTILE) * WAIT_SAFETY_FACTOR * 2 ** attempt
+        return min(max(timeout, MIN_WAIT_TIME), MAX_WAIT_TIME)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Returns count, failures, latency percentiles and current timeout per action."""
+        return {
+            key: {
+                "count": len(samples),
+                "failures": self.failures.get(key, 0),
+                "p50": percentile(samples, 50) if samples else None,
+                f"p{WAIT_PERCENTILE}": percentile(samples, WAIT_PERCENTILE) if samples else None,
+                "timeout": self.timeout_for(key),
+            }
+            for key, samples in {**{key: [] for key in self.failures}, **self.samples}.items()
+        }
+
+    def load(self) -> None:
+        """Loads the samples of earlier runs from the run profile."""
+        stored = read_json(RUN_PROFILE_PATH, {}).get("scraper", {}).get("samples", {})
+        for key, samples in stored.items():
+            self.samples[key] = list(samples)[-TELEMETRY_HISTORY:]
+
+    def save(self) -> None:
+        """Writes the samples and a per-action summary of this run to the run profile."""
+        try:
+            with CACHE_LOCK:
+                profile = read_json(RUN_PROFILE_PATH, {})
+                profile["scraper"] = {"samples": dict(self.samples), "summary": self.summary()}
+                write_json(RUN_PROFILE_PATH, profile)
+        except OSError as e:
+            logger.warning(f"can't save scraper telemetry: {e}")
+
+# Telemetry shared by all scraper actions of the process
+telemetry = ActionTelemetry()
+
+# Function to retry an action with adaptive timeouts and backoff
+def retry_action(
+    action_func: Callable[[float], None],
+    max_attempts: int = DEFAULT_RETRY_ATTEMPTS,
+    key: Optional[str] = None
+) -> None:
+    """
+    Runs an action with the timeout derived from its telemetry, retrying transient errors
+    with a longer timeout after a jittered exponential backoff. Non-transient errors are raised at once.
+
+    Args:
+        action_func (Callable[[float], None]): The action; receives the timeout in seconds.
+        max_attempts (int): The maximum number of attempts. Defaults to DEFAULT_RETRY_ATTEMPTS.
+        key (Optional[str]): Telemetry key of the action. Defaults to None (no telemetry).
+
+    Raises:
+        Exception: The last transient error once attempts are exhausted, or the first non-transient one.
+    """
+    for attempt in range(max_attempts):
+        timeout = telemetry.timeout_for(key, attempt) if key else MAX_WAIT_TIME
+        start_time = time.perf_counter()
+        try:
+            action_func(timeout)
+        except TRANSIENT_ERRORS as e:
+            if key:
+                telemetry.record(key, time.perf_counter() - start_time, ok=False)
+            if attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{key or 'action'} failed ({type(e).__name__}, timeout {timeout:.1f}s), retry in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            if key:
+                telemetry.record(key, time.perf_counter() - start_time)
+            return